@@ -0,0 +1,389 @@
+"""
+Decorator: a bounded, expiring and thread-safe memoization decorator
+
+The `memoize` decorator in `04-2-1--decorator--timeit.py` keeps every result forever in one dictionary,
+only works with positional arguments, and is not safe when several threads call the decorated function.
+The `memoize` decorator below is used in the same way, and it adds:
+- `maxsize`: at most this many results are kept; to make room, the *least recently used* (LRU)
+or the *least frequently used* (LFU) result is evicted;
+- `ttl`: results expire after this many seconds;
+- keyword arguments and a custom `key` function that maps the arguments to a cache key;
+- `cache_info()` and `cache_clear()` as in `functools.lru_cache`;
+- *lock striping*: the cache is split into `stripes` segments, each with its own lock,
+so threads using different keys rarely wait for each other.
+
+No lock is held while the decorated function runs, so recursive functions can be memoized,
+but two threads that miss the same key at the same time both compute it
+(see *single-flight* in `08--performance-patterns/08-1--cache-aside--faker--sqlite3--redis`).
+The LRU or LFU order is kept per segment, so with several stripes, eviction is approximate for the whole cache.
+
+The locks and the bookkeeping are written in Python, so a hit costs several times more
+than with the dictionary of `memoize_v1` or with `functools.lru_cache`, which is written in C.
+With the GIL, the threads hardly ever wait for a lock anyway, so striping pays off
+in a free-threaded build of Python, where the threads really run in parallel.
+
+See also:
+- https://docs.python.org/3/library/functools.html#functools.lru_cache
+"""
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize", "evictions", "expirations"])
+
+# Separates the positional arguments from the keyword arguments in a key
+_KWARGS_MARK = object()
+# A single argument of these types is its own key, as in `functools.lru_cache`
+_FAST_TYPES = {int, str}
+
+
+def make_key(args, kwargs):
+    """ Return a hashable key of the arguments; keyword arguments given in any order make the same key. """
+    if kwargs:
+        return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    if len(args) == 1 and type(args[0]) in _FAST_TYPES:
+        return args[0]
+    return args
+
+
+def key_maker(func):
+    """
+    Return a function that makes the cache key of a call of `func`.
+    If `func` has only ordinary parameters, the arguments are put in the order of the parameters
+    with the defaults filled in, so `f(1)`, `f(1, b=2)` and `f(a=1)` share a key if `b` defaults to 2.
+    """
+    parameters = list(inspect.signature(func).parameters.values())
+    if any(parameter.kind != parameter.POSITIONAL_OR_KEYWORD for parameter in parameters):
+        return make_key
+    names = [parameter.name for parameter in parameters]
+    defaults = [parameter.default for parameter in parameters]
+    missing = inspect.Parameter.empty
+
+    def make_call_key(args, kwargs):
+        if not kwargs and len(args) == len(names):
+            return make_key(args, None)
+        if len(args) < len(names) and all(name in names[len(args):] for name in kwargs):
+            values = list(args)
+            for name, default in zip(names[len(args):], defaults[len(args):]):
+                value = kwargs.get(name, default)
+                if value is missing:
+                    # A missing argument: the call itself will raise the `TypeError`
+                    return make_key(args, kwargs)
+                values.append(value)
+            return make_key(tuple(values), None)
+        # A keyword argument that is unknown or already given positionally: the call itself will raise the `TypeError`
+        return make_key(args, kwargs)
+
+    return make_call_key
+
+
+class _Segment:
+    """ A part of the cache with its own lock and counters. """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class LRUSegment(_Segment):
+    """ Evict the least recently used entry. The dictionary keeps the entries in the order of use. """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        # key -> (value, expires_at or None), the least recently used first
+        self.entries = OrderedDict()
+
+    def get(self, key, now):
+        """ Return `(True, value)` for a cached key or `(False, None)`. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] is None or entry[1] > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[0]
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, expires_at):
+        if self.maxsize == 0:
+            # Nothing is cached, as with `lru_cache(maxsize=0)`
+            return
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            elif self.maxsize is not None and len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = (value, expires_at)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class LFUSegment(_Segment):
+    """
+    Evict the least frequently used entry, the least recently used one among equally used entries.
+    The keys are grouped by their number of uses, so every operation takes constant time.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        # key -> [value, expires_at or None, number of uses]
+        self.entries = {}
+        # number of uses -> keys used that many times, the least recently used first
+        self.by_uses = {}
+        self.min_uses = 0
+
+    def _unlink(self, key, uses):
+        keys = self.by_uses[uses]
+        del keys[key]
+        if not keys:
+            del self.by_uses[uses]
+
+    def get(self, key, now):
+        """ Return `(True, value)` for a cached key or `(False, None)`. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[1] is None or entry[1] > now:
+                    uses = entry[2]
+                    self._unlink(key, uses)
+                    if self.min_uses == uses and uses not in self.by_uses:
+                        self.min_uses = uses + 1
+                    entry[2] = uses + 1
+                    self.by_uses.setdefault(uses + 1, OrderedDict())[key] = None
+                    self.hits += 1
+                    return True, entry[0]
+                del self.entries[key]
+                self._unlink(key, entry[2])
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, expires_at):
+        if self.maxsize == 0:
+            # Nothing is cached, as with `lru_cache(maxsize=0)`
+            return
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry[0], entry[1] = value, expires_at
+                return
+            if self.maxsize is not None and len(self.entries) >= self.maxsize:
+                if self.min_uses not in self.by_uses:
+                    # Expired entries were removed since the minimum was known
+                    self.min_uses = min(self.by_uses)
+                evicted, _ = self.by_uses[self.min_uses].popitem(last=False)
+                if not self.by_uses[self.min_uses]:
+                    del self.by_uses[self.min_uses]
+                del self.entries[evicted]
+                self.evictions += 1
+            self.entries[key] = [value, expires_at, 1]
+            self.by_uses.setdefault(1, OrderedDict())[key] = None
+            self.min_uses = 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_uses.clear()
+            self.min_uses = 0
+
+
+_POLICIES = {"lru": LRUSegment, "lfu": LFUSegment}
+
+
+def memoize(func=None, *, maxsize=128, ttl=None, policy="lru", key=None, stripes=16):
+    """
+    Memoize `func`, usable as `@memoize` or with options as `@memoize(maxsize=1024, ttl=60, policy="lfu")`.
+    With `maxsize=None`, the cache is unbounded, with `maxsize=0`, nothing is cached;
+    `key(*args, **kwargs)` replaces the default cache key.
+    """
+    if func is None:
+        return functools.partial(memoize, maxsize=maxsize, ttl=ttl, policy=policy, key=key, stripes=stripes)
+    if maxsize is None:
+        segment_sizes = [None] * stripes
+    else:
+        # Every segment holds at least one entry
+        stripes = max(1, min(stripes, maxsize))
+        # Split `maxsize` exactly: the first `maxsize % stripes` segments hold one entry more
+        size, extra = divmod(maxsize, stripes)
+        segment_sizes = [size + (i < extra) for i in range(stripes)]
+    segments = [_POLICIES[policy](segment_size) for segment_size in segment_sizes]
+    make_call_key = key_maker(func)
+
+    @functools.wraps(func)
+    def memoizer(*args, **kwargs):
+        cache_key = key(*args, **kwargs) if key is not None else make_call_key(args, kwargs)
+        segment = segments[hash(cache_key) % stripes]
+        # Without a TTL, nothing expires and the clock isn't read
+        now = time.monotonic() if ttl is not None else None
+        found, value = segment.get(cache_key, now)
+        if found:
+            return value
+        value = func(*args, **kwargs)
+        segment.set(cache_key, value, time.monotonic() + ttl if ttl is not None else None)
+        return value
+
+    def cache_info() -> CacheInfo:
+        return CacheInfo(
+            hits=sum(segment.hits for segment in segments),
+            misses=sum(segment.misses for segment in segments),
+            maxsize=maxsize,
+            currsize=sum(len(segment) for segment in segments),
+            evictions=sum(segment.evictions for segment in segments),
+            expirations=sum(segment.expirations for segment in segments),
+        )
+
+    def cache_clear():
+        for segment in segments:
+            segment.clear()
+
+    memoizer.cache_info = cache_info
+    memoizer.cache_clear = cache_clear
+    return memoizer
+
+
+# The decorator of `04-2-1--decorator--timeit.py`, for comparison
+def memoize_v1(func):
+    cache = {}
+
+    @functools.wraps(func)
+    def memoizer(*args):
+        if args not in cache:
+            value = func(*args)
+            cache[args] = value
+            return value
+        return cache[args]
+
+    return memoizer
+
+
+@memoize(maxsize=None)
+def fibonacci(num):
+    if num in (0, 1):
+        return num
+    return fibonacci(num - 1) + fibonacci(num - 2)
+
+
+# Keyword arguments and a time to live: exchange rates change, so they are cached for a short time only
+@memoize(maxsize=1024, ttl=0.05)
+def exchange_rate(base, quote="USD"):
+    print(f"Fetching the rate {base}/{quote}...")
+    return {"EUR": 1.08, "GBP": 1.27}[base]
+
+
+# A custom key: the case of the name doesn't matter
+@memoize(key=lambda name: name.lower())
+def greet(name):
+    return f"Hello, {name.title()}!"
+
+
+def hit_ratio(policy, maxsize=100, lookups=100_000):
+    """
+    Look up a few hot keys mixed with many cold keys, each of which is rarely used again.
+    The cold keys push the hot keys out of an LRU cache, but not out of an LFU cache.
+    """
+
+    @memoize(maxsize=maxsize, policy=policy, stripes=1)
+    def square(n):
+        return n * n
+
+    rng = random.Random(0)
+    for _ in range(lookups):
+        # Half of the lookups go to 80 hot keys, the other half to 10,000 cold keys
+        square(rng.randrange(80) if rng.random() < 0.5 else 1000 + rng.randrange(10_000))
+    info = square.cache_info()
+    return info.hits / (info.hits + info.misses)
+
+
+def calls_per_second(memoized, threads=1, calls=200_000, keys=1000):
+    """ Call a memoized function with cached keys from several threads; return the total calls per second. """
+    for n in range(keys):
+        memoized(n)
+    per_thread = calls // threads
+
+    def worker(offset):
+        for i in range(per_thread):
+            memoized((i + offset) % keys)
+
+    workers = [threading.Thread(target=worker, args=(t * 97,)) for t in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    print(f"fibonacci(300) = {fibonacci(300)}")
+    print(fibonacci.cache_info())
+
+    print(exchange_rate("EUR"), exchange_rate(base="EUR"), exchange_rate(quote="USD", base="EUR"))
+    time.sleep(0.1)
+    print(exchange_rate("EUR"))
+    print(exchange_rate.cache_info())
+
+    print(greet("ada"), greet("ADA"))
+    print(greet.cache_info())
+
+    # The segments together never hold more than `maxsize` entries
+    for policy in ("lru", "lfu"):
+        bounded = memoize(maxsize=100, policy=policy)(lambda n: n * n)
+        for n in range(10_000):
+            bounded(n)
+        info = bounded.cache_info()
+        assert info.currsize <= info.maxsize
+        print(f"{policy.upper()}, 10,000 keys: {info}")
+
+    for policy in ("lru", "lfu"):
+        print(f"{policy.upper()} hit ratio with hot keys and scans: {hit_ratio(policy):.1%}")
+
+    def square(n):
+        return n * n
+
+    candidates = {
+        "functools.lru_cache": lambda: functools.lru_cache(maxsize=2048)(square),
+        "memoize_v1 (unbounded, not thread-safe)": lambda: memoize_v1(square),
+        "memoize, 1 stripe": lambda: memoize(maxsize=2048, stripes=1)(square),
+        "memoize, 16 stripes": lambda: memoize(maxsize=2048, stripes=16)(square),
+        "memoize, 16 stripes, LFU": lambda: memoize(maxsize=2048, stripes=16, policy="lfu")(square),
+        "memoize, 16 stripes, TTL": lambda: memoize(maxsize=2048, stripes=16, ttl=60)(square),
+    }
+    for name, make in candidates.items():
+        rates = [calls_per_second(make(), threads) for threads in (1, 8)]
+        print(f"{name:>40}: {rates[0]:>10,.0f} calls/s, {rates[1]:>10,.0f} calls/s with 8 threads")
+
+
+if __name__ == "__main__":
+    main()
+    # fibonacci(300) = 222232244629420445529739893461909967206666939096499764990979600
+    # CacheInfo(hits=298, misses=301, maxsize=None, currsize=301, evictions=0, expirations=0)
+    # Fetching the rate EUR/USD...
+    # 1.08 1.08 1.08
+    # Fetching the rate EUR/USD...
+    # 1.08
+    # CacheInfo(hits=2, misses=2, maxsize=1024, currsize=1, evictions=0, expirations=1)
+    # Hello, Ada! Hello, Ada!
+    # CacheInfo(hits=1, misses=1, maxsize=128, currsize=1, evictions=0, expirations=0)
+    # LRU, 10,000 keys: CacheInfo(hits=0, misses=10000, maxsize=100, currsize=100, evictions=9900, expirations=0)
+    # LFU, 10,000 keys: CacheInfo(hits=0, misses=10000, maxsize=100, currsize=100, evictions=9900, expirations=0)
+    # LRU hit ratio with hot keys and scans: 26.2%
+    # LFU hit ratio with hot keys and scans: 49.9%
+    #                      functools.lru_cache:  3,540,127 calls/s,  3,498,911 calls/s with 8 threads
+    #  memoize_v1 (unbounded, not thread-safe):  2,092,248 calls/s,  2,023,326 calls/s with 8 threads
+    #                        memoize, 1 stripe:    453,909 calls/s,    399,488 calls/s with 8 threads
+    #                      memoize, 16 stripes:    432,689 calls/s,    399,449 calls/s with 8 threads
+    #                 memoize, 16 stripes, LFU:    452,608 calls/s,    321,272 calls/s with 8 threads
+    #                 memoize, 16 stripes, TTL:    410,210 calls/s,    401,681 calls/s with 8 threads
@@ -0,0 +1,212 @@
+"""
+Worker Model: a memoization cache shared by the worker processes
+
+Worker processes don't share memory, so each of them fills its own cache
+and a sub-result needed by several workers is calculated once per process.
+`SharedMemoCache` is a hash table in a block of shared memory (`multiprocessing.shared_memory`)
+that all workers read and write, so every sub-result is calculated about once in total.
+
+- The table has a fixed number of slots of a fixed size.
+Each slot holds a sequence number, a 16-byte hash of the key, the length and the CRC-32 of the value,
+and the pickled value, which must fit into `value_size` bytes.
+- *Open addressing* with linear probing: a key is stored in the first empty slot (or the slot of the same key)
+among `MAX_PROBES` slots starting from the slot given by its hash;
+if all of them are taken, the first one is overwritten.
+- Writers take a lock shared by the processes.
+- Readers take no lock, they use the sequence number as a *seqlock*:
+a writer makes the number odd before it changes a slot and even again afterward,
+so a reader that sees an odd number, or a different number after reading the slot, reads the slot again.
+The CRC-32 also catches a value that was read while it was being changed.
+"""
+import hashlib
+import pickle
+import struct
+import time
+import zlib
+from multiprocessing import Lock, Process, Queue, shared_memory
+
+# sequence number, key hash, value length, value CRC-32
+SLOT_HEADER = struct.Struct("<I16sII")
+SEQUENCE = struct.Struct("<I")
+MAX_PROBES = 8
+# Attempts to read a slot while it is being written
+MAX_READ_ATTEMPTS = 100
+
+_MISSING = object()
+
+
+def key_hash(*parts) -> bytes:
+    """ Return a hash of the key that is the same in every process, unlike the built-in `hash()` of strings. """
+    return hashlib.blake2b(pickle.dumps(parts), digest_size=16).digest()
+
+
+class SharedMemoCache:
+    def __init__(self, slots=4096, value_size=64, name=None, lock=None):
+        self.slots = slots
+        self.value_size = value_size
+        self.slot_size = SLOT_HEADER.size + value_size
+        if name is None:
+            # A new zero-filled block: every sequence number is 0, so every slot is empty
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * self.slot_size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.lock = lock or Lock()
+        self.hits = self.misses = 0
+
+    def __getstate__(self):
+        # Worker processes attach to the same block of shared memory by its name
+        return {"slots": self.slots, "value_size": self.value_size, "name": self.memory.name, "lock": self.lock}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _offsets(self, digest):
+        home = int.from_bytes(digest[:8], "little") % self.slots
+        return [((home + probe) % self.slots) * self.slot_size for probe in range(MAX_PROBES)]
+
+    def _read_slot(self, offset):
+        """ Return `(key hash, value bytes)` of a slot, `None` for an empty slot, or `_MISSING` if it keeps changing. """
+        buf = self.memory.buf
+        for _ in range(MAX_READ_ATTEMPTS):
+            sequence, digest, length, crc = SLOT_HEADER.unpack_from(buf, offset)
+            if sequence == 0:
+                return None
+            if sequence % 2 == 0 and length <= self.value_size:
+                start = offset + SLOT_HEADER.size
+                data = bytes(buf[start:start + length])
+                if SEQUENCE.unpack_from(buf, offset)[0] == sequence and zlib.crc32(data) == crc:
+                    return digest, data
+        return _MISSING
+
+    def get(self, digest, default=None):
+        for offset in self._offsets(digest):
+            slot = self._read_slot(offset)
+            if slot is None:
+                # The probing stops at the first empty slot
+                break
+            if slot is not _MISSING and slot[0] == digest:
+                self.hits += 1
+                return pickle.loads(slot[1])
+        self.misses += 1
+        return default
+
+    def set(self, digest, value) -> bool:
+        """ Store a value; return `False` if its pickle doesn't fit into a slot. """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.value_size:
+            return False
+        buf = self.memory.buf
+        with self.lock:
+            offsets = self._offsets(digest)
+            target = offsets[0]
+            for offset in offsets:
+                sequence, slot_digest, _, _ = SLOT_HEADER.unpack_from(buf, offset)
+                if sequence == 0 or slot_digest == digest:
+                    target = offset
+                    break
+            sequence = SEQUENCE.unpack_from(buf, target)[0]
+            SEQUENCE.pack_into(buf, target, sequence + 1)
+            start = target + SLOT_HEADER.size
+            buf[start:start + len(data)] = data
+            SLOT_HEADER.pack_into(buf, target, sequence + 1, digest, len(data), zlib.crc32(data))
+            SEQUENCE.pack_into(buf, target, sequence + 2)
+        return True
+
+    def close(self):
+        self.memory.close()
+
+    def unlink(self):
+        """ Free the shared memory; called once by the process that created it. """
+        self.memory.unlink()
+
+
+def shared_memoize(cache: SharedMemoCache):
+    """ Memoize a function in a `SharedMemoCache`, e.g. in every worker process. """
+
+    def decorator(func):
+        def memoizer(*args):
+            digest = key_hash(func.__qualname__, args)
+            value = cache.get(digest, _MISSING)
+            if value is _MISSING:
+                value = func(*args)
+                cache.set(digest, value)
+            return value
+
+        return memoizer
+
+    return decorator
+
+
+# Example: tasks that need overlapping, CPU-heavy sub-results
+
+def sub_result(k):
+    """ A CPU-heavy calculation, which takes a few milliseconds. """
+    return sum(i * i % (k + 7) for i in range(30_000))
+
+
+def make_tasks(n_tasks=40, keys_per_task=100, distinct_keys=400):
+    # Every task needs 100 of 400 sub-results, so the tasks need many of the same ones
+    return [[(task * 37 + i * 7) % distinct_keys for i in range(keys_per_task)] for task in range(n_tasks)]
+
+
+def worker(task_queue, result_queue, cache):
+    calculations = 0
+
+    def counted_sub_result(k):
+        nonlocal calculations
+        calculations += 1
+        return sub_result(k)
+
+    if cache == "per-process":
+        memo = {}
+
+        def cached(k):
+            if k not in memo:
+                memo[k] = counted_sub_result(k)
+            return memo[k]
+    elif cache is None:
+        cached = counted_sub_result
+    else:
+        cached = shared_memoize(cache)(counted_sub_result)
+
+    while (task := task_queue.get()) is not None:
+        sum(cached(k) for k in task)
+    result_queue.put(calculations)
+    if isinstance(cache, SharedMemoCache):
+        cache.close()
+
+
+def run(cache, n_workers=4):
+    task_queue, result_queue = Queue(), Queue()
+    for task in make_tasks():
+        task_queue.put(task)
+    # One `None` per worker tells it to stop
+    for _ in range(n_workers):
+        task_queue.put(None)
+
+    start = time.perf_counter()
+    processes = [Process(target=worker, args=(task_queue, result_queue, cache)) for _ in range(n_workers)]
+    for process in processes:
+        process.start()
+    calculations = sum(result_queue.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return calculations, time.perf_counter() - start
+
+
+def main():
+    shared = SharedMemoCache(slots=4096, value_size=64)
+    try:
+        for name, cache in (("no cache", None), ("per-process caches", "per-process"), ("shared cache", shared)):
+            calculations, duration = run(cache)
+            print(f"{name:>20}: {calculations:>5} sub-results calculated in {duration:.2f} s")
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+if __name__ == "__main__":
+    main()
+    #             no cache:  4000 sub-results calculated in 13.96 s
+    #   per-process caches:  1577 sub-results calculated in 6.35 s
+    #         shared cache:   437 sub-results calculated in 1.85 s
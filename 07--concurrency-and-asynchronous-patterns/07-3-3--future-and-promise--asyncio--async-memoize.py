@@ -0,0 +1,190 @@
+"""
+Future and Promise: memoizing coroutines
+
+`functools.lru_cache` can't memoize a coroutine function:
+it caches the coroutine object of the first call, which can be awaited only once,
+so the second call with the same arguments gets an exhausted coroutine instead of the result.
+
+The `async_memoize` decorator caches the Future of a call, an `asyncio.Task`, and returns its result:
+- concurrent calls with the same arguments await the same task, so the coroutine runs once;
+- results are kept for `ttl` seconds after they are available, and at most `maxsize` of them,
+the least recently used ones are evicted;
+- exceptions are not cached: the next call tries again;
+- cancellation: a caller that is cancelled stops waiting, but the task goes on for the other callers;
+only if the last caller waiting for it is cancelled, the task is cancelled as well and nothing is cached.
+
+The cache belongs to the event loop that runs the task; a call from another event loop starts a new task.
+"""
+import asyncio
+import functools
+import time
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "shared", "maxsize", "currsize"])
+
+# Separates the positional arguments from the keyword arguments in a key
+_KWARGS_MARK = object()
+
+
+class _Entry:
+    def __init__(self, task):
+        self.task = task
+        # Set when the task has finished, if there is a TTL
+        self.expires_at = None
+        # Callers currently awaiting the task
+        self.waiters = 0
+
+    def failed(self) -> bool:
+        return self.task.done() and (self.task.cancelled() or self.task.exception() is not None)
+
+
+def _make_key(args, kwargs):
+    return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items())) if kwargs else args
+
+
+def async_memoize(func=None, *, maxsize=128, ttl=None, key=None):
+    """
+    Memoize a coroutine function,
+    usable as `@async_memoize` or with options as `@async_memoize(maxsize=1024, ttl=60)`.
+    """
+    if func is None:
+        return functools.partial(async_memoize, maxsize=maxsize, ttl=ttl, key=key)
+    entries = OrderedDict()
+    stats = {"hits": 0, "misses": 0, "shared": 0}
+
+    def forget(cache_key, entry):
+        if entries.get(cache_key) is entry:
+            del entries[cache_key]
+
+    def on_done(cache_key, entry, task):
+        if entry.failed():
+            forget(cache_key, entry)
+        elif ttl is not None:
+            entry.expires_at = time.monotonic() + ttl
+
+    @functools.wraps(func)
+    async def memoizer(*args, **kwargs):
+        cache_key = key(*args, **kwargs) if key is not None else _make_key(args, kwargs)
+        loop = asyncio.get_running_loop()
+        entry = entries.get(cache_key)
+        if entry is not None:
+            if entry.failed() or (entry.expires_at is not None and entry.expires_at <= time.monotonic()):
+                forget(cache_key, entry)
+                entry = None
+            elif entry.task.done():
+                entries.move_to_end(cache_key)
+                stats["hits"] += 1
+                return entry.task.result()
+            elif entry.task.get_loop() is not loop:
+                # A task of another event loop can't be awaited here
+                entry = None
+            else:
+                entries.move_to_end(cache_key)
+                stats["shared"] += 1
+
+        if entry is None:
+            stats["misses"] += 1
+            entry = _Entry(loop.create_task(func(*args, **kwargs)))
+            entries[cache_key] = entry
+            entry.task.add_done_callback(functools.partial(on_done, cache_key, entry))
+            if maxsize is not None and len(entries) > maxsize:
+                # Tasks still running go on for their callers, they are only not cached anymore
+                entries.popitem(last=False)
+
+        entry.waiters += 1
+        try:
+            # Cancelling this caller must not cancel the task the other callers share
+            return await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if not entry.task.done() and entry.waiters == 1:
+                # Nobody else waits for the result
+                entry.task.cancel()
+                forget(cache_key, entry)
+            raise
+        finally:
+            entry.waiters -= 1
+
+    def cache_info() -> CacheInfo:
+        return CacheInfo(stats["hits"], stats["misses"], stats["shared"], maxsize, len(entries))
+
+    def cache_clear():
+        entries.clear()
+
+    memoizer.cache_info = cache_info
+    memoizer.cache_clear = cache_clear
+    return memoizer
+
+
+# The coroutine of `07-3-2--future-and-promise--asyncio.py`, memoized
+@async_memoize(maxsize=128, ttl=60)
+async def division_of_ten(x):
+    print(f"Dividing 10 by {x}...")
+    # Simulate some IO-bound operation
+    await asyncio.sleep(1)
+    return 10 / x
+
+
+@functools.lru_cache(maxsize=128)
+async def lru_cached_division_of_ten(x):
+    await asyncio.sleep(1)
+    return 10 / x
+
+
+async def timed(label, coroutine):
+    start = time.perf_counter()
+    try:
+        result = await coroutine
+    except Exception as e:
+        result = f"{type(e).__name__}: {e}"
+    print(f"{label}: {result} in {time.perf_counter() - start:.2f} s")
+    return result
+
+
+async def main():
+    # `lru_cache` returns the same coroutine object again
+    await timed("lru_cache, the first call", lru_cached_division_of_ten(2))
+    await timed("lru_cache, the second call", lru_cached_division_of_ten(2))
+
+    # Five concurrent calls share one division
+    await timed("5 concurrent calls", asyncio.gather(*(division_of_ten(2) for _ in range(5))))
+    await timed("a later call", division_of_ten(2))
+
+    # Errors are not cached
+    await timed("the first call", division_of_ten(0))
+    await timed("the second call", division_of_ten(0))
+
+    # One of two callers is cancelled: the other one still gets the result
+    first, second = asyncio.create_task(division_of_ten(5)), asyncio.create_task(division_of_ten(5))
+    await asyncio.sleep(0.1)
+    first.cancel()
+    await timed("the caller that was not cancelled", second)
+    print(f"The cancelled caller: cancelled = {first.cancelled()}")
+
+    # The only caller is cancelled: the division is cancelled too and the next call starts again
+    only = asyncio.create_task(division_of_ten(10))
+    await asyncio.sleep(0.1)
+    only.cancel()
+    await asyncio.gather(only, return_exceptions=True)
+    await timed("the call after the cancelled one", division_of_ten(10))
+
+    print(division_of_ten.cache_info())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    # lru_cache, the first call: 5.0 in 1.00 s
+    # lru_cache, the second call: RuntimeError: cannot reuse already awaited coroutine in 0.00 s
+    # Dividing 10 by 2...
+    # 5 concurrent calls: [5.0, 5.0, 5.0, 5.0, 5.0] in 1.00 s
+    # a later call: 5.0 in 0.00 s
+    # Dividing 10 by 0...
+    # the first call: ZeroDivisionError: division by zero in 1.00 s
+    # Dividing 10 by 0...
+    # the second call: ZeroDivisionError: division by zero in 1.00 s
+    # Dividing 10 by 5...
+    # the caller that was not cancelled: 2.0 in 0.90 s
+    # The cancelled caller: cancelled = True
+    # Dividing 10 by 10...
+    # Dividing 10 by 10...
+    # the call after the cancelled one: 1.0 in 1.00 s
+    # CacheInfo(hits=1, misses=6, shared=5, maxsize=128, currsize=3)
@@ -0,0 +1,206 @@
+"""
+Cache-Aside with asyncio
+
+One process serves many concurrent clients:
+the cache is accessed with the asyncio client of redis-py (`redis.asyncio`),
+and the blocking SQLite reads run on a bounded pool of threads,
+so they never block the event loop.
+
+The quotes are served over TCP: a client sends a line with quote ids separated by whitespace
+and receives a line with a JSON object mapping each id to its quote (or `null`).
+
+Run the server:
+```unix
+$ python async_cache_aside.py
+Serving quotes on 127.0.0.1:8765
+```
+```unix
+$ nc 127.0.0.1 8765
+1 2 77
+{"1": "Town might cover level.", "2": "Reality kitchen set step tend.", "77": null}
+```
+
+Run a load test against an in-process server:
+```unix
+$ python async_cache_aside.py load_test
+```
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import redis.asyncio
+import cache_aside
+from cache_aside import CACHE_TTL, DB_PATH, NOT_FOUND, cache_key, is_valid_id, jittered_ttl
+from quote_reader import QuoteReader
+from single_flight import AsyncSingleFlight
+
+HOST = "127.0.0.1"
+PORT = 8765
+# Threads reading SQLite, each with its own connection
+DB_WORKERS = 4
+# Concurrent requests share a bounded number of Redis connections and wait for a free one
+REDIS_CONNECTIONS = 50
+
+cache = redis.asyncio.StrictRedis(
+    connection_pool=redis.asyncio.BlockingConnectionPool(
+        host="localhost", port=6379, decode_responses=True, max_connections=REDIS_CONNECTIONS
+    )
+)
+reader = QuoteReader(DB_PATH)
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="sqlite-reader")
+loads = AsyncSingleFlight()
+
+
+async def run_in_db_thread(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(db_executor, fn, *args)
+
+
+def _cache_entry(quote):
+    """ Return the value to cache and its TTL, or `None` if nothing is cached. """
+    if quote is not None:
+        return quote, jittered_ttl(CACHE_TTL)
+    if cache_aside.negative_ttl is not None:
+        return NOT_FOUND, jittered_ttl(cache_aside.negative_ttl)
+    return None
+
+
+async def _load_quote(quote_id, key):
+    quote = await run_in_db_thread(reader.fetch_quote, quote_id)
+    if entry := _cache_entry(quote):
+        value, ttl = entry
+        await cache.set(key, value, px=round(ttl * 1000))
+    return quote
+
+
+async def get_quote(quote_id: str) -> str | None:
+    """
+    Fetch a quote by its identifier, or `None` if there is no such quote.
+    Concurrent misses of the same key share one database query.
+    """
+    if not is_valid_id(quote_id):
+        return None
+    key = cache_key(quote_id)
+    quote = await cache.get(key)
+    if quote == NOT_FOUND:
+        return None
+    if quote is None:
+        quote = await loads.do(key, _load_quote, quote_id, key)
+    return quote
+
+
+async def get_quotes(quote_ids) -> dict[str, str | None]:
+    """ Fetch many quotes with one MGET, one database query for the misses and one pipeline. """
+    quote_ids = list(dict.fromkeys(quote_ids))
+    if not quote_ids:
+        return {}
+
+    quotes = dict(zip(quote_ids, await cache.mget([cache_key(quote_id) for quote_id in quote_ids])))
+    for quote_id, quote in quotes.items():
+        if quote == NOT_FOUND:
+            quotes[quote_id] = None
+    # Ids that aren't integers can't be in the database and would make the `IN (...)` query fail for the whole batch
+    missing = [quote_id for quote_id, quote in quotes.items() if quote is None and is_valid_id(quote_id)]
+
+    if missing:
+        found = await run_in_db_thread(reader.fetch_quotes, missing)
+        async with cache.pipeline(transaction=False) as pipe:
+            for quote_id in missing:
+                quote = quotes[quote_id] = found.get(int(quote_id))
+                if entry := _cache_entry(quote):
+                    value, ttl = entry
+                    pipe.set(cache_key(quote_id), value, px=round(ttl * 1000))
+            await pipe.execute()
+
+    return quotes
+
+
+async def handle_client(stream_reader, stream_writer):
+    try:
+        while line := await stream_reader.readline():
+            quote_ids = line.decode().split()
+            if all(quote_id.isdigit() for quote_id in quote_ids):
+                response = await get_quotes(quote_ids)
+            else:
+                response = {"error": "You must enter numbers separated by spaces."}
+            stream_writer.write(json.dumps(response).encode() + b"\n")
+            await stream_writer.drain()
+    finally:
+        stream_writer.close()
+
+
+async def serve(host=HOST, port=PORT):
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"Serving quotes on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+async def load_test(connections=200, lookups_per_connection=25, max_id=20):
+    """ Send thousands of lookups over many concurrent connections and report throughput and latency. """
+    global cache
+    import redis_stand_in
+    cache = await redis_stand_in.connect_async(max_connections=REDIS_CONNECTIONS)
+    # Keep the keys of this run apart from real quotes in a shared Redis, so only they are deleted afterward
+    original_prefix = cache_aside.CACHE_KEY_PREFIX
+    cache_aside.CACHE_KEY_PREFIX = f"loadtest.{os.getpid()}.quote"
+    try:
+        await _load_test(connections, lookups_per_connection, max_id)
+    finally:
+        keys = [key async for key in cache.scan_iter(match=f"{cache_aside.CACHE_KEY_PREFIX}.*")]
+        if keys:
+            await cache.delete(*keys)
+        cache_aside.CACHE_KEY_PREFIX = original_prefix
+        await cache.aclose()
+
+
+async def _load_test(connections, lookups_per_connection, max_id):
+    """ The lookups of `load_test`, run under the key prefix of the run. """
+    server = await asyncio.start_server(handle_client, HOST, 0)
+    port = server.sockets[0].getsockname()[1]
+    latencies = []
+
+    async def client():
+        stream_reader, stream_writer = await asyncio.open_connection(HOST, port)
+        for _ in range(lookups_per_connection):
+            start = time.perf_counter()
+            stream_writer.write(f"{random.randint(1, max_id)}\n".encode())
+            await stream_writer.drain()
+            json.loads(await stream_reader.readline())
+            latencies.append(time.perf_counter() - start)
+        stream_writer.close()
+        await stream_writer.wait_closed()
+
+    async with server:
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(connections)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies):,} lookups over {connections} connections in {elapsed:.2f} s: "
+          f"{len(latencies) / elapsed:,.0f} lookups/s")
+    print(f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    quotes = await asyncio.gather(*(get_quote(str(i % max_id + 1)) for i in range(5000)))
+    elapsed = time.perf_counter() - start
+    print(f"{len(quotes):,} concurrent get_quote calls in {elapsed:.2f} s: {len(quotes) / elapsed:,.0f} lookups/s")
+
+
+def main():
+    if sys.argv[1:] == ["load_test"]:
+        asyncio.run(load_test())
+    else:
+        asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
+    # $ python async_cache_aside.py load_test
+    # 5,000 lookups over 200 connections in 1.98 s: 2,527 lookups/s
+    # p50 36.51 ms, p99 89.02 ms
+    # 5,000 concurrent get_quote calls in 1.07 s: 4,693 lookups/s
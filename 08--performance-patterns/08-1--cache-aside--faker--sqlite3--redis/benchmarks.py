@@ -0,0 +1,668 @@
+"""
+Benchmarks for the cache-aside example.
+
+Run all benchmarks or only the named ones:
+```unix
+$ python benchmarks.py
+$ python benchmarks.py db_misses
+```
+"""
+import asyncio
+import contextlib
+import os
+import random
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+import cache_aside
+import database
+import redis_stand_in
+from cache_backends import CircuitBreakerBackend, InMemoryBackend, RedisBackend, ShardedBackend, SQLiteBackend
+from load_generator import percentile
+from quote_reader import QuoteReader
+from snapshot_reader import SnapshotQuoteReader
+from value_codecs import CodecBackend, CompressedCodec, JsonCodec, MsgpackCodec, RawCodec, Utf8Codec
+from single_flight import AsyncSingleFlight, SingleFlight
+
+DB_PATH = Path(__file__).parent / Path("quotes.sqlite3")
+
+
+def legacy_fetch_quote(quote_id):
+    """ The cache-miss path as it was: a new connection and a new SQL text per lookup. """
+    query = f"SELECT text FROM quotes WHERE id = {quote_id}"
+    with sqlite3.connect(DB_PATH) as db:
+        cursor = db.cursor()
+        res = cursor.execute(query).fetchone()
+        return res[0] if res else None
+
+
+def bench_db_misses(n=20_000):
+    """ Compare cache misses per second hitting the database. """
+    reader = QuoteReader(DB_PATH)
+    ids = [str(i % 10 + 1) for i in range(n)]
+
+    for name, fetch in (("connect per miss + f-string", legacy_fetch_quote), ("QuoteReader", reader.fetch_quote)):
+        start = time.perf_counter()
+        for quote_id in ids:
+            fetch(quote_id)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>30}: {n / elapsed:>10,.0f} misses/s")
+
+    reader.close()
+
+
+class RoundTripCounter:
+    """ Wrap a Redis client and count the requests sent to the server. """
+
+    def __init__(self, client):
+        self.client = client
+        self.round_trips = 0
+
+    def pipeline(self, *args, **kwargs):
+        return _CountedPipeline(self, self.client.pipeline(*args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        def command(*args, **kwargs):
+            self.round_trips += 1
+            return attr(*args, **kwargs)
+
+        return command
+
+
+class _CountedPipeline:
+    def __init__(self, counter, pipe):
+        self.counter = counter
+        self.pipe = pipe
+
+    def execute(self):
+        # All buffered commands are sent together
+        self.counter.round_trips += 1
+        return self.pipe.execute()
+
+    def __getattr__(self, name):
+        return getattr(self.pipe, name)
+
+
+def bench_round_trips(page_size=50, quotes=1000):
+    """ Compare Redis round trips of one `get_quotes` call with `get_quote` per id. """
+    client = redis_stand_in.connect()
+    # A page of distinct ids, most of them found and a few missing, since `get_quotes` drops duplicates
+    page = [str(i) for i in range(1, page_size + 1)] + [str(quotes + i) for i in range(1, page_size // 10 + 1)]
+    original_reader, original_cache = cache_aside.reader, cache_aside.cache
+
+    with tempfile.TemporaryDirectory() as tmp, run_key_prefix(client, "round-trips"):
+        db_path = Path(tmp) / "quotes.sqlite3"
+        database.setup_db(db_path)
+        database.bulk_add_quotes(sample_quotes(quotes), db_path)
+        cache_aside.reader = QuoteReader(db_path)
+
+        results = {}
+        for name, fetch_page in (
+            ("get_quote per id", lambda ids: [cache_aside.get_quote(quote_id) for quote_id in ids]),
+            ("get_quotes", cache_aside.get_quotes),
+        ):
+            counter = RoundTripCounter(client)
+            cache_aside.cache = RedisBackend(counter)
+            client.delete(*[cache_aside.cache_key(quote_id) for quote_id in page])
+            fetch_page(page)
+            cold = counter.round_trips
+            counter.round_trips = 0
+            fetch_page(page)
+            results[name] = (cold, counter.round_trips)
+            print(f"{name:>30}: {cold:>4} round trips cold, {counter.round_trips:>4} warm ({len(page)} distinct ids)")
+
+        saved = [single - bulk for single, bulk in zip(results["get_quote per id"], results["get_quotes"])]
+        print(f"{'saved per page':>30}: {saved[0]:>4} round trips cold, {saved[1]:>4} warm")
+        cache_aside.reader.close()
+    cache_aside.reader, cache_aside.cache = original_reader, original_cache
+
+
+def bench_local_cache(n=50_000, hot_keys=10):
+    """ Compare `get_quote` latency for hot keys without and with the local (L1) cache. """
+    client = redis_stand_in.connect()
+    cache_aside.cache = RedisBackend(client)
+    ids = [str(i % hot_keys + 1) for i in range(n)]
+
+    for name in ("Redis only", "L1 + Redis"):
+        if name == "Redis only":
+            cache_aside.disable_local_cache()
+        else:
+            local_cache = cache_aside.enable_local_cache()
+        for quote_id in ids[:hot_keys]:
+            cache_aside.get_quote(quote_id)  # warm up
+        samples = []
+        for quote_id in ids:
+            start = time.perf_counter_ns()
+            cache_aside.get_quote(quote_id)
+            samples.append(time.perf_counter_ns() - start)
+        samples.sort()
+        p50, p99 = percentile(samples, 50), percentile(samples, 99)
+        print(f"{name:>30}: p50 {p50 / 1000:>8.2f} us, p99 {p99 / 1000:>8.2f} us")
+
+    print(f"{'L1 stats':>30}: {local_cache.stats()}")
+    cache_aside.disable_local_cache()
+
+
+class SlowQuoteReader(QuoteReader):
+    """ A reader that counts its queries and takes a while to answer them. """
+
+    def __init__(self, *args, delay=0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def fetch_quote(self, quote_id):
+        with self._lock:
+            self.queries += 1
+        time.sleep(self.delay)
+        return super().fetch_quote(quote_id)
+
+
+def bench_stampede(callers=50):
+    """ Count database queries when many callers miss the same key at once. """
+    client = redis_stand_in.connect()
+    cache_aside.cache = RedisBackend(client)
+    original_reader, original_loads = cache_aside.reader, cache_aside.loads
+
+    class NoSingleFlight:
+        def do(self, key, fn, *args, **kwargs):
+            return fn(*args, **kwargs)
+
+    with run_key_prefix(client, "stampede"):
+        for name, loads in (
+            ("threads, no single-flight", NoSingleFlight()), ("threads, single-flight", SingleFlight())
+        ):
+            cache_aside.reader, cache_aside.loads = SlowQuoteReader(DB_PATH), loads
+            client.delete(cache_aside.cache_key("1"))
+            barrier = threading.Barrier(callers)
+
+            def call():
+                barrier.wait()
+                cache_aside.get_quote("1")
+
+            threads = [threading.Thread(target=call) for _ in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            print(f"{name:>30}: {cache_aside.reader.queries:>4} queries for {callers} callers")
+
+    cache_aside.reader, cache_aside.loads = original_reader, original_loads
+
+    async def async_stampede():
+        reader = SlowQuoteReader(DB_PATH)
+        loads = AsyncSingleFlight()
+        results = await asyncio.gather(
+            *(loads.do("quote.1", asyncio.to_thread, reader.fetch_quote, "1") for _ in range(callers))
+        )
+        assert len(set(results)) == 1
+        return reader.queries
+
+    print(f"{'asyncio, single-flight':>30}: {asyncio.run(async_stampede()):>4} queries for {callers} callers")
+
+
+def quote_pool(distinct=1000) -> list[str]:
+    """ Return a few fake quotes; build the pool before the timed part, Faker is slow. """
+    return [database.fake.sentence() for _ in range(distinct)]
+
+
+def sample_quotes(n, distinct=1000, pool=None):
+    """ Cycle through a few fake quotes, so the benchmark measures the inserts and not Faker. """
+    if pool is None:
+        pool = quote_pool(distinct)
+    for i in range(n):
+        yield pool[i % len(pool)]
+
+
+def bench_bulk_load(n=1_000_000, n_row_by_row=100_000):
+    """ Compare rows per second of `add_quotes` and `bulk_add_quotes`. """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "quotes.sqlite3"
+        database.setup_db(db_path)
+        pool = quote_pool()
+
+        start = time.perf_counter()
+        database.add_quotes(sample_quotes(n_row_by_row, pool=pool), db_path)
+        elapsed = time.perf_counter() - start
+        print(f"{'add_quotes':>30}: {n_row_by_row / elapsed:>10,.0f} rows/s ({n_row_by_row:,} rows)")
+
+        start = time.perf_counter()
+        count = database.bulk_add_quotes(sample_quotes(n, pool=pool), db_path)
+        elapsed = time.perf_counter() - start
+        print(f"{'bulk_add_quotes':>30}: {count / elapsed:>10,.0f} rows/s ({count:,} rows)")
+
+
+def delete_keys(client, prefix):
+    """ Delete the keys of a benchmark run, not the whole database, which may hold real data. """
+    keys = list(client.scan_iter(match=f"{prefix}.*"))
+    if keys:
+        client.delete(*keys)
+
+
+@contextlib.contextmanager
+def run_key_prefix(client, name):
+    """
+    Give the cache keys of a benchmark run their own prefix, apart from real quotes in a shared Redis,
+    and delete only those keys afterward.
+    """
+    original_prefix = cache_aside.CACHE_KEY_PREFIX
+    cache_aside.CACHE_KEY_PREFIX = f"bench.{name}.{os.getpid()}.quote"
+    try:
+        yield cache_aside.CACHE_KEY_PREFIX
+    finally:
+        delete_keys(client, cache_aside.CACHE_KEY_PREFIX)
+        cache_aside.CACHE_KEY_PREFIX = original_prefix
+
+
+def bench_negative_cache(n=20_000, miss_ratio=0.9, missing_ids=200):
+    """ Compare database queries and throughput for lookups that mostly ask for quotes that don't exist. """
+    client = redis_stand_in.connect()
+    cache_aside.cache = RedisBackend(client)
+    original_reader, original_negative_ttl = cache_aside.reader, cache_aside.negative_ttl
+    rng = random.Random(42)
+    ids = [
+        str(1000 + rng.randrange(missing_ids)) if rng.random() < miss_ratio else str(rng.randint(1, 10))
+        for _ in range(n)
+    ]
+
+    with run_key_prefix(client, "negative") as prefix:
+        for name, negative_ttl in (("without negative caching", None), ("with negative caching", 5.0)):
+            cache_aside.reader, cache_aside.negative_ttl = SlowQuoteReader(DB_PATH, delay=0), negative_ttl
+            delete_keys(client, prefix)
+            start = time.perf_counter()
+            for quote_id in ids:
+                cache_aside.get_quote(quote_id)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>30}: {cache_aside.reader.queries:>6,} queries, {n / elapsed:>8,.0f} lookups/s")
+
+        cache_aside.reader, cache_aside.negative_ttl = original_reader, original_negative_ttl
+
+        # TTL jitter: the quotes cached by one call don't expire at the same moment
+        delete_keys(client, prefix)
+        cache_aside.get_quotes([str(i) for i in range(1, 11)])
+        pttls = [client.pttl(cache_aside.cache_key(i)) for i in range(1, 11)]
+        print(f"{'expiry spread of one batch':>30}: {(max(pttls) - min(pttls)) / 1000:.1f} s "
+              f"(TTL {cache_aside.CACHE_TTL} s, jitter {cache_aside.ttl_jitter:.0%})")
+
+
+def bench_stale_while_revalidate(n=2_000, expire_every=50, db_delay=0.02):
+    """ Compare `get_quote` latency for a hot key that expires now and then, without and with stale-while-revalidate. """
+    client = redis_stand_in.connect()
+    cache_aside.cache = RedisBackend(client)
+    original_reader, original_swr = cache_aside.reader, cache_aside.stale_while_revalidate
+
+    with run_key_prefix(client, "swr"):
+        key = cache_aside.cache_key("1")
+        for name, swr in (("blocking reload", None), ("stale-while-revalidate", 30.0)):
+            cache_aside.reader, cache_aside.stale_while_revalidate = SlowQuoteReader(DB_PATH, delay=db_delay), swr
+            client.delete(key)
+            cache_aside.get_quote("1")
+            samples = []
+            for i in range(n):
+                if i % expire_every == 0:
+                    # Let the quote reach its expiry: the hard one without SWR, the soft one with SWR
+                    if swr is None:
+                        client.delete(key)
+                    else:
+                        client.pexpire(key, int(swr * 1000) - 1)
+                start = time.perf_counter_ns()
+                cache_aside.get_quote("1")
+                samples.append(time.perf_counter_ns() - start)
+            samples.sort()
+            print(f"{name:>30}: p50 {percentile(samples, 50) / 1000:>8.1f} us, "
+                  f"p99 {percentile(samples, 99) / 1000:>8.1f} us, max {samples[-1] / 1000:>8.1f} us")
+
+        time.sleep(db_delay * 2)  # let the last background refresh finish
+    cache_aside.reader, cache_aside.stale_while_revalidate = original_reader, original_swr
+
+
+def bench_backends(n=20_000, keys=1_000):
+    """ Compare the cache backends: raw operations per second and `get_quote` lookups per second. """
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "InMemoryBackend": InMemoryBackend(),
+            "SQLiteBackend": SQLiteBackend(Path(tmp) / "cache.sqlite3"),
+            "RedisBackend": RedisBackend(redis_stand_in.connect()),
+        }
+        original_cache = cache_aside.cache
+        for name, backend in backends.items():
+            start = time.perf_counter()
+            for i in range(n):
+                backend.set(f"bench.{i % keys}", "x" * 50, ttl=60)
+            set_rate = n / (time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for i in range(n):
+                backend.get(f"bench.{i % keys}")
+            get_rate = n / (time.perf_counter() - start)
+
+            cache_aside.cache = backend
+            start = time.perf_counter()
+            for i in range(n):
+                cache_aside.get_quote(str(i % 10 + 1))
+            lookup_rate = n / (time.perf_counter() - start)
+            print(f"{name:>30}: set {set_rate:>9,.0f}/s, get {get_rate:>9,.0f}/s, get_quote {lookup_rate:>9,.0f}/s")
+        cache_aside.cache = original_cache
+
+
+def bench_outage(n=200):
+    """ Compare `get_quote` latency while Redis is down, without and with the circuit breaker. """
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+    # A server that accepts connections but never answers, like a hanging Redis
+    hanging = socket.socket()
+    hanging.bind(("127.0.0.1", 0))
+    hanging.listen(128)
+    hanging_port = hanging.getsockname()[1]
+    original_cache = cache_aside.cache
+
+    for outage, port in (("closed port", closed_port), ("hanging server", hanging_port)):
+        # With the defaults of redis-py, which retry with backoff, every lookup would take seconds
+        for name, backend, calls in (
+            ("timeout 0.1 s, no breaker", RedisBackend(host="127.0.0.1", port=port, timeout=0.1), 10),
+            ("timeout 0.1 s + breaker", CircuitBreakerBackend(
+                RedisBackend(host="127.0.0.1", port=port, timeout=0.1), InMemoryBackend()
+            ), n),
+        ):
+            cache_aside.cache = backend
+            failed = 0
+            start = time.perf_counter()
+            for i in range(calls):
+                try:
+                    cache_aside.get_quote(str(i % 10 + 1))
+                except Exception:
+                    failed += 1
+            elapsed = time.perf_counter() - start
+            print(f"{outage + ', ' + name:>45}: {elapsed / calls * 1000:>8.2f} ms/lookup, {failed}/{calls} failed")
+
+    hanging.close()
+    cache_aside.cache = original_cache
+
+
+def bench_snapshot(n=50_000, quotes=100_000, threads=4):
+    """ Compare database reads from the file and from an in-memory snapshot. """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "quotes.sqlite3"
+        database.setup_db(db_path)
+        database.bulk_add_quotes(sample_quotes(quotes), db_path)
+        rng = random.Random(0)
+        ids = [rng.randint(1, quotes) for _ in range(n)]
+
+        for name, reader in (("file-backed", QuoteReader(db_path)), ("in-memory snapshot", SnapshotQuoteReader(db_path))):
+            start = time.perf_counter()
+            for quote_id in ids:
+                reader.fetch_quote(quote_id)
+            single = n / (time.perf_counter() - start)
+
+            def read(chunk):
+                for quote_id in chunk:
+                    reader.fetch_quote(quote_id)
+
+            workers = [threading.Thread(target=read, args=(ids[i::threads],)) for i in range(threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            multi = n / (time.perf_counter() - start)
+            print(f"{name:>30}: {single:>9,.0f} reads/s, {multi:>9,.0f} reads/s with {threads} threads")
+            reader.close()
+
+
+def bench_sharding(shards=4, keys=100_000, page_size=100, pages=200):
+    """ Measure key movement when a shard is added, and multi-key reads fanned out over the shards. """
+    # Separate Redis servers on consecutive ports, or separate fakeredis servers
+    nodes = {f"redis-{i}": RedisBackend(redis_stand_in.connect(port=7000 + i)) for i in range(shards)}
+    sharded = ShardedBackend(nodes)
+    all_keys = [cache_aside.cache_key(i) for i in range(keys)]
+
+    before = {key: sharded.node_for(key) for key in all_keys}
+    counts = {}
+    for node in before.values():
+        counts[node] = counts.get(node, 0) + 1
+    print(f"{'keys per shard':>30}: {', '.join(f'{counts[name]:,}' for name in nodes)}")
+
+    sharded.add_node(f"redis-{shards}", RedisBackend(redis_stand_in.connect(port=7000 + shards)))
+    moved = sum(before[key] != sharded.node_for(key) for key in all_keys)
+    print(f"{'moved when adding a shard':>30}: {moved / keys:.1%} (ideal {1 / (shards + 1):.1%}, "
+          f"modulo hashing {1 - 1 / (shards + 1):.1%})")
+
+    sharded.set_many({key: ("x" * 50, 60) for key in all_keys[:page_size * 10]})
+    rng = random.Random(0)
+    page_keys = [rng.sample(all_keys[:page_size * 10], page_size) for _ in range(pages)]
+    start = time.perf_counter()
+    for page in page_keys:
+        sharded.mget(page)
+    elapsed = time.perf_counter() - start
+    print(f"{'mget over shards':>30}: {pages / elapsed:>9,.0f} pages/s ({page_size} keys per page)")
+
+
+def bench_search(n=1_000_000, queries=200, like_queries=5):
+    """ Compare full-text search over a million quotes with a LIKE scan and with cached search results. """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "quotes.sqlite3"
+        database.setup_db(db_path)
+        pool = quote_pool(100_000)
+        start = time.perf_counter()
+        database.bulk_add_quotes(sample_quotes(n, pool=pool), db_path)
+        print(f"{'bulk_add_quotes with index':>30}: {n / (time.perf_counter() - start):>10,.0f} rows/s ({n:,} rows)")
+
+        reader = QuoteReader(db_path)
+        rng = random.Random(0)
+        words = [rng.choice(database.fake.sentence().split()).strip(".").lower() for _ in range(queries)]
+        latencies = []
+        for word in words:
+            start = time.perf_counter()
+            reader.search(word)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"{'FTS5 MATCH':>30}: p50 {percentile(latencies, 50) * 1000:>7.2f} ms, "
+              f"p99 {percentile(latencies, 99) * 1000:>7.2f} ms")
+
+        # Without an index, all matches must be found to pick the best ones, so every text is scanned
+        start = time.perf_counter()
+        for word in words[:like_queries]:
+            reader.connection().execute("SELECT id, text FROM quotes WHERE text LIKE ?", (f"%{word}%",)).fetchall()
+        print(f"{'LIKE scan':>30}: {(time.perf_counter() - start) / like_queries * 1000:>7.2f} ms/query")
+
+        original_reader, original_cache = cache_aside.reader, cache_aside.cache
+        original_prefix = cache_aside.CACHE_KEY_PREFIX
+        client = redis_stand_in.connect()
+        try:
+            cache_aside.reader, cache_aside.cache = reader, RedisBackend(client)
+            cache_aside.CACHE_KEY_PREFIX = f"bench.search.{time.time_ns()}"
+            for word in words:
+                cache_aside.search_quotes(word)
+            start = time.perf_counter()
+            for word in words * 10:
+                cache_aside.search_quotes(word)
+            elapsed = time.perf_counter() - start
+            print(f"{'cached search_quotes':>30}: {elapsed / (len(words) * 10) * 1000:>7.2f} ms/query")
+        finally:
+            delete_keys(client, cache_aside.CACHE_KEY_PREFIX)
+            cache_aside.reader, cache_aside.cache = original_reader, original_cache
+            cache_aside.CACHE_KEY_PREFIX = original_prefix
+            reader.close()
+
+
+def _value_size(client, key):
+    """ Return the memory Redis uses for a key or, where MEMORY USAGE is not supported, the size of its value. """
+    try:
+        return client.memory_usage(key)
+    except redis_stand_in.redis.ResponseError:
+        return client.strlen(key)
+
+
+def bench_codecs(keys=1_000, hits=20_000, page_size=50):
+    """ Compare the memory per key in Redis and the CPU time per hit of the value encodings. """
+    quotes = [database.fake.sentence() for _ in range(keys)]
+    values = {
+        "quote": quotes,
+        # A page of quotes as one long text and as structured rows
+        "page": ["\n".join(quotes[i:i + page_size]) for i in range(keys)],
+        "rows": [[{"id": j, "text": quotes[j % keys]} for j in range(i, i + page_size)] for i in range(keys)],
+    }
+
+    def optional(make):
+        try:
+            return make()
+        except ImportError:
+            return None
+
+    text_codecs = {
+        "utf8": Utf8Codec(),
+        "raw": RawCodec(),
+        "zlib": CompressedCodec.zlib(),
+        "lz4": optional(CompressedCodec.lz4),
+    }
+    encodings = {
+        "quote": {"decode_responses": None, **text_codecs},
+        "page": {"decode_responses": None, **text_codecs},
+        "rows": {
+            "json": JsonCodec(),
+            "msgpack": optional(MsgpackCodec),
+            "zlib+json": CompressedCodec.zlib(inner=JsonCodec()),
+            "zlib+msgpack": optional(lambda: CompressedCodec.zlib(inner=MsgpackCodec())),
+        },
+    }
+    text_client = redis_stand_in.connect()
+    bytes_client = redis_stand_in.connect(decode_responses=False)
+    for kind, kind_encodings in encodings.items():
+        for name, codec in kind_encodings.items():
+            label = f"{kind}, {name}"
+            if name != "decode_responses" and codec is None:
+                print(f"{label:>30}: not installed")
+                continue
+            if codec is None:
+                client = text_client
+                backend = RedisBackend(text_client)
+            else:
+                client = bytes_client
+                backend = CodecBackend(RedisBackend(bytes_client), codec)
+            prefix = f"bench.codec.{kind}.{name}"
+            backend.set_many({f"{prefix}.{i}": (value, 60) for i, value in enumerate(values[kind])})
+            size = sum(_value_size(client, f"{prefix}.{i}") for i in range(0, keys, 10)) / len(range(0, keys, 10))
+
+            # The CPU time of this process; with fakeredis, it includes the work of the stand-in server
+            start = time.process_time()
+            for i in range(hits):
+                backend.get(f"{prefix}.{i % keys}")
+            cpu_per_hit = (time.process_time() - start) / hits
+
+            # Only the decoding of the replies, which is all a codec adds to a hit
+            stored = bytes_client.mget([f"{prefix}.{i}" for i in range(keys)])
+            decode = codec.decode if codec is not None else bytes.decode
+            start = time.process_time()
+            for i in range(hits):
+                decode(stored[i % keys])
+            decode_per_hit = (time.process_time() - start) / hits
+            print(f"{label:>30}: {size:>7,.0f} bytes/key, {cpu_per_hit * 1e6:>6.1f} us CPU/hit, "
+                  f"{decode_per_hit * 1e6:>5.2f} us to decode")
+
+
+BENCHMARKS = {
+    "db_misses": bench_db_misses,
+    "round_trips": bench_round_trips,
+    "local_cache": bench_local_cache,
+    "stampede": bench_stampede,
+    "bulk_load": bench_bulk_load,
+    "negative_cache": bench_negative_cache,
+    "stale_while_revalidate": bench_stale_while_revalidate,
+    "backends": bench_backends,
+    "outage": bench_outage,
+    "snapshot": bench_snapshot,
+    "sharding": bench_sharding,
+    "search": bench_search,
+    "codecs": bench_codecs,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"--- {name} ---")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
+    # --- db_misses ---
+    #    connect per miss + f-string:      6,811 misses/s
+    #                    QuoteReader:     90,826 misses/s
+    # --- round_trips ---
+    # Table 'quotes' created
+    # Search index 'quotes_fts' created
+    #               get_quote per id:  110 round trips cold,   55 warm (55 distinct ids)
+    #                     get_quotes:    2 round trips cold,    1 warm (55 distinct ids)
+    #                 saved per page:  108 round trips cold,   54 warm
+    # --- local_cache ---
+    #                     Redis only: p50    91.99 us, p99   171.18 us
+    #                     L1 + Redis: p50     2.02 us, p99     3.25 us
+    #                       L1 stats: {'size': 10, 'hits': 50000, 'misses': 10, 'evictions': 0}
+    # --- stampede ---
+    #      threads, no single-flight:   50 queries for 50 callers
+    #         threads, single-flight:    1 queries for 50 callers
+    #         asyncio, single-flight:    1 queries for 50 callers
+    # --- bulk_load ---
+    # Table 'quotes' created
+    # Search index 'quotes_fts' created
+    #                     add_quotes:     22,597 rows/s (100,000 rows)
+    #                bulk_add_quotes:    127,182 rows/s (1,000,000 rows)
+    # --- negative_cache ---
+    #       without negative caching: 18,075 queries,    5,356 lookups/s
+    #          with negative caching:    210 queries,   11,270 lookups/s
+    #     expiry spread of one batch: 9.0 s (TTL 60 s, jitter 10%)
+    # --- stale_while_revalidate ---
+    #                blocking reload: p50     55.1 us, p99  20727.6 us, max  22428.2 us
+    #         stale-while-revalidate: p50    141.0 us, p99    262.7 us, max   1438.0 us
+    # --- backends ---
+    #                InMemoryBackend: set   393,080/s, get   605,710/s, get_quote   423,468/s
+    #                  SQLiteBackend: set    41,519/s, get    85,533/s, get_quote    77,981/s
+    #                   RedisBackend: set     7,215/s, get    11,942/s, get_quote    11,504/s
+    # --- outage ---
+    #        closed port, timeout 0.1 s, no breaker:     1.30 ms/lookup, 10/10 failed
+    #          closed port, timeout 0.1 s + breaker:     0.03 ms/lookup, 0/200 failed
+    #     hanging server, timeout 0.1 s, no breaker:   101.32 ms/lookup, 10/10 failed
+    #       hanging server, timeout 0.1 s + breaker:     1.54 ms/lookup, 0/200 failed
+    # --- snapshot ---
+    # Table 'quotes' created
+    # Search index 'quotes_fts' created
+    #                    file-backed:   122,476 reads/s,   154,782 reads/s with 4 threads
+    #             in-memory snapshot:   166,341 reads/s,   140,601 reads/s with 4 threads
+    # --- sharding ---
+    #                 keys per shard: 25,050, 23,896, 27,767, 23,287
+    #      moved when adding a shard: 21.2% (ideal 20.0%, modulo hashing 80.0%)
+    #               mget over shards:       779 pages/s (100 keys per page)
+    # --- codecs ---
+    #        quote, decode_responses:      35 bytes/key,   84.0 us CPU/hit,  0.18 us to decode
+    #                    quote, utf8:      35 bytes/key,   81.8 us CPU/hit,  0.23 us to decode
+    #                     quote, raw:      35 bytes/key,   88.6 us CPU/hit,  0.09 us to decode
+    #                    quote, zlib:      36 bytes/key,   77.6 us CPU/hit,  0.50 us to decode
+    #                     quote, lz4:      36 bytes/key,   83.3 us CPU/hit,  0.58 us to decode
+    #         page, decode_responses:   1,813 bytes/key,   91.2 us CPU/hit,  0.58 us to decode
+    #                     page, utf8:   1,813 bytes/key,   91.9 us CPU/hit,  0.60 us to decode
+    #                      page, raw:   1,813 bytes/key,   76.5 us CPU/hit,  0.12 us to decode
+    #                     page, zlib:   1,008 bytes/key,  106.0 us CPU/hit, 20.30 us to decode
+    #                      page, lz4:   1,610 bytes/key,   81.6 us CPU/hit,  4.26 us to decode
+    #                     rows, json:   2,851 bytes/key,  122.4 us CPU/hit, 35.26 us to decode
+    #                  rows, msgpack:   2,470 bytes/key,  103.0 us CPU/hit, 21.81 us to decode
+    #                rows, zlib+json:   1,249 bytes/key,  134.5 us CPU/hit, 59.61 us to decode
+    #             rows, zlib+msgpack:   1,310 bytes/key,  147.5 us CPU/hit, 53.26 us to decode
+    # --- search ---
+    # Table 'quotes' created
+    # Search index 'quotes_fts' created
+    #     bulk_add_quotes with index:    131,266 rows/s (1,000,000 rows)
+    #                     FTS5 MATCH: p50   17.02 ms, p99   21.09 ms
+    #                      LIKE scan:  279.63 ms/query
+    #           cached search_quotes:    0.10 ms/query
@@ -1,10 +1,145 @@
-import sqlite3
-import redis
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from cache_backends import CacheBackend, CircuitBreakerBackend, InMemoryBackend, RedisBackend
+from local_cache import LocalCache
+from quote_reader import QuoteReader
+from single_flight import SingleFlight
+from snapshot_reader import SnapshotQuoteReader
 
 CACHE_KEY_PREFIX = "quote"
+CACHE_TTL = 60  # seconds
 DB_PATH = Path(__file__).parent / Path("quotes.sqlite3")
-cache = redis.StrictRedis(host="localhost", port=6379, decode_responses=True)
+# Give up on a Redis command after this many seconds
+REDIS_TIMEOUT = 0.1
+# Any `CacheBackend` can be assigned here; the Redis client connects on first use, not at import time.
+# While Redis is failing, the quotes are cached in the process instead.
+cache: CacheBackend = CircuitBreakerBackend(
+    RedisBackend(host="localhost", port=6379, timeout=REDIS_TIMEOUT),
+    fallback=InMemoryBackend(),
+)
+# Reuse a read-only connection per thread instead of connecting on every cache miss
+reader = QuoteReader(DB_PATH)
+# Optional in-process cache in front of Redis, see `enable_local_cache`
+local_cache: LocalCache | None = None
+# Concurrent misses of the same key share one database query
+loads = SingleFlight()
+# Probabilistic early recomputation (XFetch) of keys about to expire in Redis, disabled if `None`.
+# Values above 1 favor earlier recomputation, values below 1 favor later recomputation.
+early_recompute_beta: float | None = None
+# Moving average of the database load time, in seconds
+_load_time = 0.001
+# Randomize every TTL by up to this fraction, so entries cached together don't expire together
+ttl_jitter = 0.1
+# Remember for this many seconds that a quote does not exist, disabled if `None`
+negative_ttl: float | None = 5.0
+# Cached in place of a quote that does not exist
+NOT_FOUND = "\x00not-found"
+# Stale-while-revalidate: keep quotes in Redis for this many seconds after they expire (their *soft* expiry),
+# serve them stale during that time and refresh them in the background; disabled if `None`
+stale_while_revalidate: float | None = None
+refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quote-refresher")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+# Quotes put in the cache by `warm_cache` by default
+WARM_UP_QUOTES = 1000
+# Search results are cached for this many seconds, so new quotes show up in them after at most that long
+SEARCH_TTL = 60
+
+
+def cache_key(quote_id) -> str:
+    return f"{CACHE_KEY_PREFIX}.{quote_id}"
+
+
+def jittered_ttl(ttl) -> float:
+    """ Return `ttl` randomized by up to `ttl_jitter` in both directions. """
+    return ttl * (1 + random.uniform(-ttl_jitter, ttl_jitter))
+
+
+def _cache_ttl(value, ttl) -> float:
+    """ Return how long to keep a value in the cache: quotes stay beyond their TTL while they may be served stale. """
+    if stale_while_revalidate is not None and value != NOT_FOUND:
+        return ttl + stale_while_revalidate
+    return ttl
+
+
+def _fresh_ttl(value, cache_ttl):
+    """ Return how long a value read from the cache stays fresh, negative if it's stale. """
+    if stale_while_revalidate is not None and value != NOT_FOUND and cache_ttl is not None:
+        return cache_ttl - stale_while_revalidate
+    return cache_ttl
+
+
+def enable_local_cache(maxsize=1024, ttl=10.0) -> LocalCache:
+    """ Put a bounded in-process (L1) cache in front of Redis. Its TTL never exceeds the Redis TTL. """
+    global local_cache
+    local_cache = LocalCache(maxsize=maxsize, ttl=min(ttl, CACHE_TTL))
+    return local_cache
+
+
+def disable_local_cache():
+    global local_cache
+    local_cache = None
+
+
+def use_snapshot(check_interval=1.0) -> SnapshotQuoteReader:
+    """ Serve cache misses from an in-memory copy of the database, refreshed when the file changes. """
+    global reader
+    reader = SnapshotQuoteReader(DB_PATH, check_interval=check_interval)
+    return reader
+
+
+def _should_recompute_early(ttl) -> bool:
+    """
+    Decide whether to reload a key before it expires.
+    The closer the expiry and the longer a reload takes, the more likely the key is reloaded early,
+    so the reloads of a hot key are spread out over time instead of all happening at its expiry.
+    """
+    if early_recompute_beta is None or ttl is None:
+        return False
+    return -_load_time * early_recompute_beta * math.log(1.0 - random.random()) >= ttl
+
+
+def _load_quote(quote_id, key):
+    """ Load a quote from the database and put it in the cache. """
+    global _load_time
+    start = time.perf_counter()
+    quote = reader.fetch_quote(quote_id)
+    _load_time = 0.9 * _load_time + 0.1 * (time.perf_counter() - start)
+    if quote is not None:
+        value, ttl = quote, jittered_ttl(CACHE_TTL)
+    elif negative_ttl is not None:
+        value, ttl = NOT_FOUND, jittered_ttl(negative_ttl)
+    else:
+        return None
+    cache.set(key, value, ttl=_cache_ttl(value, ttl))
+    if local_cache is not None:
+        local_cache.set(key, value, ttl=ttl)
+    return quote
+
+
+def _refresh_in_background(quote_id, key) -> bool:
+    """ Schedule a reload of a stale quote unless one is already scheduled for it. """
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+
+    def refresh():
+        try:
+            loads.do(key, _load_quote, quote_id, key)
+        except Exception as e:
+            print(e)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    refresher.submit(refresh)
+    return True
 
 
 def get_quote(quote_id: str) -> str:
@@ -15,26 +150,48 @@ def get_quote(quote_id: str) -> str:
     and put the result in the cache before returning it.
     """
     out = []
-    quote = cache.get(f"{CACHE_KEY_PREFIX}.{quote_id}")
+    key = cache_key(quote_id)
+
+    if local_cache is not None:
+        quote = local_cache.get(key)
+        if quote == NOT_FOUND:
+            return "There was no quote stored matching that id!"
+        if quote is not None:
+            return f"Got '{quote}' FROM LOCAL CACHE."
+
+    stale = False
+    if local_cache is not None or early_recompute_beta is not None or stale_while_revalidate is not None:
+        quote, ttl = cache.get_with_ttl(key)
+        ttl = _fresh_ttl(quote, ttl)
+        if quote is not None and ttl is not None and ttl <= 0:
+            # Past its soft expiry: serve the quote now and let one background task reload it
+            stale = True
+            _refresh_in_background(quote_id, key)
+        elif _should_recompute_early(ttl):
+            quote = None
+        elif quote is not None and local_cache is not None:
+            # An entry must not stay in the local cache longer than it is fresh in Redis
+            local_cache.set(key, quote, ttl=ttl)
+    else:
+        quote = cache.get(key)
+
+    if quote == NOT_FOUND:
+        # The database was queried for this id a moment ago and had no quote
+        return "There was no quote stored matching that id!"
 
     if quote is None:
-        # Get quote from the database
-        query = f"SELECT text FROM quotes WHERE id = {quote_id}"
+        # Get quote from the database; concurrent callers missing the same key wait for one query
         try:
-            with sqlite3.connect(DB_PATH) as db:
-                cursor = db.cursor()
-                res = cursor.execute(query).fetchone()
-                if not res:
-                    return "There was no quote stored matching that id!"
-                quote = res[0]
-                out.append(f"Got '{quote}' FROM DB.")
+            quote = loads.do(key, _load_quote, quote_id, key)
+            if quote is None:
+                return "There was no quote stored matching that id!"
+            out.append(f"Got '{quote}' FROM DB.")
         except Exception as e:
             print(e)
         else:
-            # Add to the cache
-            cache_key = f"{CACHE_KEY_PREFIX}.{quote_id}"
-            cache.set(cache_key, quote, ex=60)
-            out.append(f"Added TO CACHE, with key '{cache_key}'.")
+            out.append(f"Added TO CACHE, with key '{key}'.")
+    elif stale:
+        out.append(f"Got '{quote}' FROM CACHE (stale, refreshing in the background).")
     else:
         # Use quote from the cache
         out.append(f"Got '{quote}' FROM CACHE.")
@@ -42,6 +199,141 @@ def get_quote(quote_id: str) -> str:
     return "\n".join(out) if out else ""
 
 
+def is_valid_id(quote_id) -> bool:
+    """ Tell whether an id can be looked up: the ids of the quotes are integers. """
+    try:
+        int(quote_id)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def get_quotes(quote_ids) -> dict[str, str | None]:
+    """
+    Fetch many quotes at once.
+    All keys are read from the cache with a single MGET,
+    all misses are loaded from the database with a single `IN (...)` query,
+    and the loaded quotes are put in the cache with a single pipeline.
+    Quotes that are stored nowhere are mapped to `None`.
+    """
+    # Drop duplicates but keep the order
+    quote_ids = list(dict.fromkeys(quote_ids))
+    if not quote_ids:
+        return {}
+
+    quotes = {}
+    remote_ids = quote_ids
+    if local_cache is not None:
+        for quote_id in quote_ids:
+            quotes[quote_id] = local_cache.get(cache_key(quote_id))
+        remote_ids = [quote_id for quote_id in quote_ids if quotes[quote_id] is None]
+
+    if remote_ids:
+        keys = [cache_key(quote_id) for quote_id in remote_ids]
+        if local_cache is not None or stale_while_revalidate is not None:
+            # Read the remaining TTLs along with the values
+            values_with_ttls = cache.mget_with_ttl(keys)
+            values = [value for value, _ in values_with_ttls]
+            for quote_id, key, (value, ttl) in zip(remote_ids, keys, values_with_ttls):
+                if value is None:
+                    continue
+                ttl = _fresh_ttl(value, ttl)
+                if ttl is not None and ttl <= 0:
+                    _refresh_in_background(quote_id, key)
+                elif local_cache is not None:
+                    local_cache.set(key, value, ttl=ttl)
+        else:
+            values = cache.mget(keys)
+        quotes.update(zip(remote_ids, values))
+
+    missing = [quote_id for quote_id, quote in quotes.items() if quote is None]
+    for quote_id, quote in quotes.items():
+        if quote == NOT_FOUND:
+            quotes[quote_id] = None
+
+    # Ids that aren't integers can't be in the database and would make the `IN (...)` query fail for the whole batch
+    missing = [quote_id for quote_id in missing if is_valid_id(quote_id)]
+    if missing:
+        try:
+            found = reader.fetch_quotes(missing)
+        except Exception as e:
+            print(e)
+        else:
+            loaded = {quote_id: found[int(quote_id)] for quote_id in missing if int(quote_id) in found}
+            entries = {cache_key(quote_id): (quote, jittered_ttl(CACHE_TTL)) for quote_id, quote in loaded.items()}
+            if negative_ttl is not None:
+                for quote_id in missing:
+                    if quote_id not in loaded:
+                        entries[cache_key(quote_id)] = (NOT_FOUND, jittered_ttl(negative_ttl))
+            if entries:
+                cache.set_many({key: (value, _cache_ttl(value, ttl)) for key, (value, ttl) in entries.items()})
+                if local_cache is not None:
+                    for key, (value, ttl) in entries.items():
+                        local_cache.set(key, value, ttl=ttl)
+            quotes.update(loaded)
+
+    return quotes
+
+
+def search_key(query, limit) -> str:
+    # The index ignores case and spacing, so queries that differ only in those share a key
+    return f"{CACHE_KEY_PREFIX}.search.{limit}.{' '.join(query.lower().split())}"
+
+
+def _load_search(query, limit, key):
+    results = reader.search(query, limit)
+    cache.set(key, json.dumps(results), ttl=jittered_ttl(SEARCH_TTL))
+    return results
+
+
+def search_quotes(query, limit=10) -> list[tuple[int, str]]:
+    """
+    Return the `(id, text)` rows of the best `limit` quotes containing all words of `query`.
+    The results of a query are cached as one JSON value, so a popular query costs one cache read;
+    on a miss, they come from the full-text index and concurrent misses share one search.
+    """
+    key = search_key(query, limit)
+    cached = cache.get(key)
+    if cached is not None:
+        return [tuple(row) for row in json.loads(cached)]
+    try:
+        return loads.do(key, _load_search, query, limit, key)
+    except Exception as e:
+        print(e)
+        return []
+
+
+def warm_cache(top_n=WARM_UP_QUOTES, quote_ids=None, chunk_size=500, max_keys_per_second=5000) -> int:
+    """
+    Load quotes into the cache before the first requests arrive, e.g. right after a deploy.
+    Without `quote_ids`, the first `top_n` quotes by id are loaded;
+    pass the ids ordered by recorded access frequency to load the most popular quotes instead.
+    The quotes are read from the database in chunks and every chunk is written with a single `set_many`.
+    Writes are paced to `max_keys_per_second`, so warming doesn't starve live traffic.
+    Return the number of quotes loaded.
+    """
+    if quote_ids is None:
+        chunks = reader.iter_quotes(limit=top_n, chunk_size=chunk_size)
+    else:
+        quote_ids = list(quote_ids)[:top_n]
+        chunks = (
+            reader.fetch_quotes(quote_ids[i:i + chunk_size]).items() for i in range(0, len(quote_ids), chunk_size)
+        )
+
+    count = 0
+    start = time.monotonic()
+    for rows in chunks:
+        entries = {cache_key(quote_id): (quote, _cache_ttl(quote, jittered_ttl(CACHE_TTL))) for quote_id, quote in rows}
+        cache.set_many(entries)
+        count += len(entries)
+        # Wait until the writes so far fit in the allowed rate
+        delay = start + count / max_keys_per_second - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    return count
+
+
 def main():
     while True:
         quote_id = input("Enter the ID of the quote: ")
@@ -0,0 +1,412 @@
+"""
+Cache backends for the cache-aside example.
+
+`cache_aside` only talks to the `CacheBackend` interface,
+so the same code runs with Redis, with a cache inside the process, or with a cache in a local file
+on nodes without Redis.
+TTLs are given in seconds; `None` means the entry never expires.
+"""
+import bisect
+import hashlib
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Mapping, Protocol, Sequence
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> str | None:
+        """Return the value of a key or `None` if it is missing or expired"""
+        ...
+
+    def mget(self, keys: Sequence[str]) -> list[str | None]:
+        """Return the values of many keys, in the order of the keys"""
+        ...
+
+    def set(self, key: str, value: str, ttl: float | None = None):
+        """Store a value for `ttl` seconds"""
+        ...
+
+    def set_many(self, entries: Mapping[str, tuple[str, float | None]]):
+        """Store many values at once; `entries` maps each key to its value and TTL"""
+        ...
+
+    def get_with_ttl(self, key: str) -> tuple[str | None, float | None]:
+        """Return the value of a key and its remaining TTL"""
+        ...
+
+    def mget_with_ttl(self, keys: Sequence[str]) -> list[tuple[str | None, float | None]]:
+        """Return the values of many keys and their remaining TTLs"""
+        ...
+
+
+def _px(ttl) -> int:
+    """ Convert a TTL in seconds to milliseconds for the `px` argument of SET. """
+    return max(1, round(ttl * 1000))
+
+
+def _remaining_ttl(pttl):
+    """ Convert a PTTL reply to seconds; `None` means the key never expires. """
+    return pttl / 1000 if pttl >= 0 else None
+
+
+class RedisBackend:
+    """
+    A cache in Redis. The client is created on first use, so importing this module doesn't need Redis.
+    With a `timeout`, a command fails after that many seconds without being retried,
+    so an unreachable server is detected quickly, e.g. by `CircuitBreakerBackend`.
+    """
+
+    def __init__(self, client=None, host="localhost", port=6379, timeout=None, **client_kwargs):
+        self._client = client
+        self._client_kwargs = {"host": host, "port": port, "decode_responses": True, **client_kwargs}
+        self.timeout = timeout
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            kwargs = self._client_kwargs
+            if self.timeout is not None:
+                from redis.backoff import NoBackoff
+                from redis.retry import Retry
+                # By default, redis-py retries failed commands with backoff, which takes seconds
+                kwargs = {
+                    "socket_timeout": self.timeout,
+                    "socket_connect_timeout": self.timeout,
+                    "retry": Retry(NoBackoff(), 0),
+                    **kwargs,
+                }
+            self._client = redis.StrictRedis(**kwargs)
+        return self._client
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def mget(self, keys):
+        return self.client.mget(keys)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, px=_px(ttl) if ttl is not None else None)
+
+    def set_many(self, entries):
+        if not entries:
+            return
+        # Send all SET commands in one round trip; no MULTI/EXEC is needed as the keys are independent
+        pipe = self.client.pipeline(transaction=False)
+        for key, (value, ttl) in entries.items():
+            pipe.set(key, value, px=_px(ttl) if ttl is not None else None)
+        pipe.execute()
+
+    def get_with_ttl(self, key):
+        # Read the value and its remaining TTL in one round trip
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        value, pttl = pipe.execute()
+        return value, _remaining_ttl(pttl)
+
+    def mget_with_ttl(self, keys):
+        if not keys:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        pipe.mget(keys)
+        for key in keys:
+            pipe.pttl(key)
+        values, *pttls = pipe.execute()
+        return [(value, _remaining_ttl(pttl)) for value, pttl in zip(values, pttls)]
+
+
+class InMemoryBackend:
+    """ A cache in a dictionary of the process. Expired entries are dropped when they are read or on a purge. """
+
+    # Drop all expired entries after this many writes
+    PURGE_EVERY = 10_000
+
+    def __init__(self):
+        # key -> (value, expires_at or None)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, None
+        value, expires_at = entry
+        if expires_at is None:
+            return value, None
+        if expires_at <= now:
+            del self._entries[key]
+            return None, None
+        return value, expires_at - now
+
+    def get(self, key):
+        return self.get_with_ttl(key)[0]
+
+    def mget(self, keys):
+        return [value for value, _ in self.mget_with_ttl(keys)]
+
+    def get_with_ttl(self, key):
+        with self._lock:
+            return self._lookup(key, time.monotonic())
+
+    def mget_with_ttl(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return [self._lookup(key, now) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: (value, ttl)})
+
+    def set_many(self, entries):
+        now = time.monotonic()
+        with self._lock:
+            for key, (value, ttl) in entries.items():
+                self._entries[key] = (value, now + ttl if ttl is not None else None)
+            self._writes += len(entries)
+            if self._writes >= self.PURGE_EVERY:
+                self._writes = 0
+                self._entries = {
+                    key: entry for key, entry in self._entries.items() if entry[1] is None or entry[1] > now
+                }
+
+
+class SQLiteBackend:
+    """
+    A cache in a local SQLite file, which survives restarts of the process.
+    Expiry times are wall-clock timestamps, so they keep their meaning across restarts.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        with sqlite3.connect(self.db_path) as db:
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache(key TEXT PRIMARY KEY, value TEXT, expires_at REAL) WITHOUT ROWID"
+            )
+        db.close()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def get(self, key):
+        return self.get_with_ttl(key)[0]
+
+    def mget(self, keys):
+        return [value for value, _ in self.mget_with_ttl(keys)]
+
+    def get_with_ttl(self, key):
+        return self.mget_with_ttl([key])[0]
+
+    def mget_with_ttl(self, keys):
+        now = time.time()
+        found = {}
+        conn = self.connection()
+        # Stay below SQLite's limit on the number of host parameters in one statement
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, value, expires_at FROM cache "
+                f"WHERE key IN ({placeholders}) AND (expires_at IS NULL OR expires_at > ?)",
+                (*chunk, now),
+            )
+            for key, value, expires_at in rows:
+                found[key] = (value, expires_at - now if expires_at is not None else None)
+        return [found.get(key, (None, None)) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: (value, ttl)})
+
+    def set_many(self, entries):
+        now = time.time()
+        conn = self.connection()
+        with conn:  # one transaction
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache(key, value, expires_at) VALUES(?, ?, ?)",
+                [(key, value, now + ttl if ttl is not None else None) for key, (value, ttl) in entries.items()],
+            )
+
+    def purge_expired(self):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+
+class CircuitBreakerBackend:
+    """
+    Use a primary backend, e.g. Redis, and switch to a fallback backend while the primary is failing.
+
+    After `fail_max` consecutive failures the circuit *opens*:
+    for `reset_timeout` seconds, all calls go to the fallback without trying the primary,
+    so an outage doesn't cost a connection timeout on every call.
+    Then the circuit is *half-open*: the next call tries the primary again
+    and closes the circuit on success or opens it again on failure.
+    (See also the Circuit Breaker pattern in `09--distributed-systems-patterns`.)
+    """
+
+    def __init__(self, primary: CacheBackend, fallback: CacheBackend, fail_max=3, reset_timeout=10.0):
+        self.primary = primary
+        self.fallback = fallback
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def _allow_primary(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let this call try the primary; concurrent calls keep using the fallback meanwhile
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def _on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def _on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.fail_max:
+                self.opened_at = time.monotonic()
+
+    def _call(self, method, *args):
+        if self._allow_primary():
+            try:
+                result = getattr(self.primary, method)(*args)
+            # Any error of the primary, e.g. a connection error or a timeout of Redis
+            except Exception:
+                self._on_failure()
+            else:
+                self._on_success()
+                return result
+        return getattr(self.fallback, method)(*args)
+
+    def get(self, key):
+        return self._call("get", key)
+
+    def mget(self, keys):
+        return self._call("mget", keys)
+
+    def set(self, key, value, ttl=None):
+        return self._call("set", key, value, ttl)
+
+    def set_many(self, entries):
+        return self._call("set_many", entries)
+
+    def get_with_ttl(self, key):
+        return self._call("get_with_ttl", key)
+
+    def mget_with_ttl(self, keys):
+        return self._call("mget_with_ttl", keys)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class ShardedBackend:
+    """
+    Spread the keys over several backends, e.g. several Redis servers, with consistent hashing.
+
+    Every backend (node) is placed on a ring of hash values at `vnodes` points (*virtual nodes*),
+    and a key belongs to the first node point after the hash of the key.
+    When a node is added or removed, only the keys between its points and the preceding ones move,
+    about 1/N of all keys, instead of nearly all keys as with `hash(key) % N`.
+    Multi-key operations are split per node and sent to the nodes in parallel.
+    """
+
+    def __init__(self, nodes: Mapping[str, CacheBackend], vnodes=100, max_workers=16):
+        if not nodes:
+            raise ValueError("ShardedBackend needs at least one node")
+        self.vnodes = vnodes
+        self.nodes = {}
+        # (sorted hash values, node name of each hash value), replaced as a whole when the nodes change
+        self._ring = ([], [])
+        for name, backend in nodes.items():
+            self.add_node(name, backend)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-shard")
+
+    def _rebuild_ring(self, names):
+        points = sorted((_hash(f"{name}#{i}"), name) for name in names for i in range(self.vnodes))
+        self._ring = ([point for point, _ in points], [name for _, name in points])
+
+    def add_node(self, name, backend):
+        # Readers must find the backend of every node on the ring, so add it before the ring changes
+        self.nodes = {**self.nodes, name: backend}
+        self._rebuild_ring(self.nodes)
+
+    def remove_node(self, name):
+        nodes = {node: backend for node, backend in self.nodes.items() if node != name}
+        if not nodes:
+            # Without a node on the ring, no key would have a place
+            raise ValueError(f"can't remove {name!r}, the last node of the ShardedBackend")
+        self._rebuild_ring(nodes)
+        self.nodes = nodes
+
+    def node_for(self, key) -> str:
+        hashes, names = self._ring
+        return names[bisect.bisect(hashes, _hash(key)) % len(hashes)]
+
+    def _group(self, keys) -> dict[str, list[str]]:
+        groups = {}
+        for key in keys:
+            groups.setdefault(self.node_for(key), []).append(key)
+        return groups
+
+    def _fan_out(self, groups, call):
+        """ Run `call(backend, group)` for every node in parallel and return the results by node. """
+        if len(groups) == 1:
+            (name, group), = groups.items()
+            return {name: call(self.nodes[name], group)}
+        futures = {name: self._executor.submit(call, self.nodes[name], group) for name, group in groups.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def get(self, key):
+        return self.nodes[self.node_for(key)].get(key)
+
+    def set(self, key, value, ttl=None):
+        self.nodes[self.node_for(key)].set(key, value, ttl)
+
+    def get_with_ttl(self, key):
+        return self.nodes[self.node_for(key)].get_with_ttl(key)
+
+    def _mget_by(self, method, keys):
+        groups = self._group(keys)
+        results = self._fan_out(groups, lambda backend, group: getattr(backend, method)(group))
+        found = {}
+        for name, group in groups.items():
+            found.update(zip(group, results[name]))
+        return [found[key] for key in keys]
+
+    def mget(self, keys):
+        return self._mget_by("mget", keys)
+
+    def mget_with_ttl(self, keys):
+        return self._mget_by("mget_with_ttl", keys)
+
+    def set_many(self, entries):
+        groups = self._group(entries)
+        self._fan_out(groups, lambda backend, group: backend.set_many({key: entries[key] for key in group}))
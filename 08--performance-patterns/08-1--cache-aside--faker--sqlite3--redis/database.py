@@ -1,37 +1,69 @@
+import itertools
 import sqlite3
-import redis
 
 from pathlib import Path
 from faker import Faker
+from cache_aside import CACHE_TTL, cache_key, jittered_ttl
+from cache_backends import CacheBackend, RedisBackend
 
-CACHE_KEY_PREFIX = "quote"
 DB_PATH = Path(__file__).parent / Path("quotes.sqlite3")
-quote_count = 0
+BATCH_SIZE = 50_000
 fake = Faker()
-cache = redis.StrictRedis(host="localhost", port=6379, decode_responses=True)
+# Adds every new quote to the full-text index
+FTS_INSERT_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON quotes BEGIN
+        INSERT INTO quotes_fts(rowid, text) VALUES (new.id, new.text);
+    END
+"""
+cache: CacheBackend = RedisBackend(host="localhost", port=6379)
 
 
-def setup_db():
+def setup_db(db_path=DB_PATH):
     try:
-        with sqlite3.connect(DB_PATH) as db:
+        with sqlite3.connect(db_path) as db:
             cursor = db.cursor()
-            cursor.execute("CREATE TABLE quotes(id INTEGER PRIMARY KEY, text TEXT)")
+            # The database allocates the ids, so several processes can add quotes at the same time
+            cursor.execute("CREATE TABLE quotes(id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT)")
             db.commit()
             print("Table 'quotes' created")
     except Exception as e:
         print(e)
+    setup_search_index(db_path)
 
 
-def add_quotes(quotes_list):
-    global quote_count
+def setup_search_index(db_path=DB_PATH):
+    """
+    Create the full-text index of the quotes, an FTS5 table, and fill it with the quotes already in the database.
+    The index stores only the tokens and reads the texts from the quotes table (`content='quotes'`);
+    triggers update it in the same transaction as every insert, update or delete of a quote.
+    """
+    try:
+        with sqlite3.connect(db_path) as db:
+            db.executescript(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(text, content='quotes', content_rowid='id');
+                {FTS_INSERT_TRIGGER};
+                CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON quotes BEGIN
+                    INSERT INTO quotes_fts(quotes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END;
+                CREATE TRIGGER IF NOT EXISTS quotes_fts_update AFTER UPDATE ON quotes BEGIN
+                    INSERT INTO quotes_fts(quotes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                    INSERT INTO quotes_fts(rowid, text) VALUES (new.id, new.text);
+                END;
+                INSERT INTO quotes_fts(quotes_fts) VALUES ('rebuild');
+            """)
+            print("Search index 'quotes_fts' created")
+    except Exception as e:
+        print(e)
+
+
+def add_quotes(quotes_list, db_path=DB_PATH):
     added_quotes_list = []
     try:
-        with sqlite3.connect(DB_PATH) as db:
+        with sqlite3.connect(db_path) as db:
             cursor = db.cursor()
             for quote in quotes_list:
-                quote_count += 1
-                cursor.execute("INSERT OR IGNORE INTO quotes(id, text) VALUES(?, ?)", (quote_count, quote))
-                added_quotes_list.append((quote_count, quote))
+                cursor.execute("INSERT INTO quotes(text) VALUES(?)", (quote,))
+                added_quotes_list.append((cursor.lastrowid, quote))
             db.commit()
     except Exception as e:
         print(e)
@@ -39,8 +71,62 @@ def add_quotes(quotes_list):
     return added_quotes_list
 
 
+def fake_quotes(n):
+    """ Generate `n` fake quotes one by one instead of building a list of them. """
+    for _ in range(n):
+        yield fake.sentence()
+
+
+def bulk_add_quotes(quotes, db_path=DB_PATH, batch_size=BATCH_SIZE) -> int:
+    """
+    Insert quotes from any iterable, e.g. a generator, and return the number of rows inserted.
+    Only one batch is held in memory at a time,
+    and every batch is inserted with a single `executemany` in a single transaction.
+    """
+    count = 0
+    quotes = iter(quotes)
+    db = sqlite3.connect(db_path)
+    try:
+        # Write-ahead logging lets readers continue while a batch is written,
+        # and with WAL, `synchronous = NORMAL` syncs to disk at checkpoints instead of at every commit
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")
+        indexed = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'quotes_fts_insert'").fetchone() is not None
+        while batch := list(itertools.islice(quotes, batch_size)):
+            with db:  # one transaction per batch
+                # Take the write lock first, so the ids after `last_id` are all from this batch
+                db.execute("BEGIN IMMEDIATE")
+                last_id = db.execute("SELECT coalesce(max(id), 0) FROM quotes").fetchone()[0]
+                if indexed:
+                    # Indexing the batch with one statement is several times faster than the trigger row by row;
+                    # other connections never see the trigger missing, as it is back when the transaction commits
+                    db.execute("DROP TRIGGER quotes_fts_insert")
+                db.executemany("INSERT INTO quotes(text) VALUES(?)", ((quote,) for quote in batch))
+                if indexed:
+                    db.execute("INSERT INTO quotes_fts(rowid, text) SELECT id, text FROM quotes WHERE id > ?", (last_id,))
+                    db.execute(FTS_INSERT_TRIGGER)
+            count += len(batch)
+    finally:
+        db.close()
+
+    return count
+
+
+def cache_quotes(added_quotes_list):
+    """
+    Write quotes through to the cache with a single `set_many` (a single pipeline with Redis).
+    Call it only after the quotes were committed to the database,
+    so readers never find a cached quote that the database does not have.
+    Each SET replaces a whole value, so readers get either the old value or the new one.
+    """
+    # Add quotes to the cache with a lifespan of about 1 minute (60 seconds).
+    # After this period, Redis will automatically delete the keys.
+    # The lifespans differ slightly, so the quotes of one batch don't all expire at the same time.
+    cache.set_many({cache_key(quote_id): (quote, jittered_ttl(CACHE_TTL)) for quote_id, quote in added_quotes_list})
+
+
 def main():
-    msg = "Choose your mode! Enter 'init' or 'update_db_only' or 'update_all': "
+    msg = "Choose your mode! Enter 'init' or 'update_db_only' or 'update_all' or 'bulk_load' or 'search_index': "
     mode = input(msg)
     mode = mode.lower()
 
@@ -53,11 +139,8 @@ def main():
         added_quotes_list = add_quotes(quotes_list)
         if added_quotes_list:
             print("New (fake) quotes added to the database.")
+            cache_quotes(added_quotes_list)
             for quote_id, quote in added_quotes_list:
-                cache_key = f"CACHE_KEY_PREFIX.{quote_id}"
-                # Add a quote to the Redis cache with a lifespan of 1 minute (60 seconds).
-                # After this period, Redis will automatically delete the key.
-                cache.set(cache_key, quote, ex=60)
                 print(f"Added: '{(quote_id, quote)}'.")
     elif mode == "update_db_only":
         # Inject the quotes into the database only
@@ -67,17 +150,26 @@ def main():
             print("New (fake) quotes added to the database ONLY.")
             for quote_id, quote in added_quotes_list:
                 print(f"Added: '{(quote_id, quote)}'.")
+    elif mode == "bulk_load":
+        # Stream many quotes into the database only
+        n = int(input("How many quotes? "))
+        count = bulk_add_quotes(fake_quotes(n))
+        print(f"{count} new (fake) quotes added to the database ONLY.")
+    elif mode == "search_index":
+        # Index the quotes of a database created before the full-text search was added
+        setup_search_index()
 
 
 if __name__ == "__main__":
     main()
     """
-    Choose your mode! Enter 'init' or 'update_db_only' or 'update_all': init
+    Choose your mode! Enter 'init' or 'update_db_only' or 'update_all' or 'bulk_load' or 'search_index': init
     Table 'quotes' created
+    Search index 'quotes_fts' created
     """
 
     """
-    Choose your mode! Enter 'init' or 'update_db_only' or 'update_all': update_db_only
+    Choose your mode! Enter 'init' or 'update_db_only' or 'update_all' or 'bulk_load' or 'search_index': update_db_only
     New (fake) quotes added to the database ONLY.
     Added: '(1, 'Town might cover level.')'.
     Added: '(2, 'Reality kitchen set step tend.')'.
@@ -0,0 +1,163 @@
+"""
+Load generator for the cache-aside example.
+
+It seeds a temporary database with fake quotes, replays a stream of quote ids
+against `cache_aside.get_quote` from several threads,
+and reports the hit ratio, the throughput and the latency percentiles.
+In real traffic, a few keys are requested far more often than the others,
+which is modeled by a Zipf distribution: the k-th most popular id is requested with a weight of 1 / k^s.
+The same seed gives the same key stream, so cache configurations can be compared reproducibly.
+
+```unix
+$ python load_generator.py --distribution zipf --threads 8
+$ python load_generator.py --distribution uniform --backend memory --local-cache
+```
+"""
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+import cache_aside
+import database
+import redis_stand_in
+from cache_backends import InMemoryBackend, RedisBackend, SQLiteBackend
+from quote_reader import QuoteReader
+
+
+class CountingQuoteReader(QuoteReader):
+    """ A reader that counts its queries: every query is a cache miss. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def fetch_quote(self, quote_id):
+        with self._lock:
+            self.queries += 1
+        return super().fetch_quote(quote_id)
+
+    def fetch_quotes(self, quote_ids):
+        with self._lock:
+            self.queries += 1
+        return super().fetch_quotes(quote_ids)
+
+
+def key_stream(n_keys, n_lookups, distribution="zipf", s=1.1, seed=0):
+    """ Return `n_lookups` quote ids between 1 and `n_keys`, drawn from a Zipf or a uniform distribution. """
+    rng = random.Random(seed)
+    ids = range(1, n_keys + 1)
+    if distribution == "uniform":
+        return [str(rng.choice(ids)) for _ in range(n_lookups)]
+    # Which ids are the popular ones is random too, not simply the smallest ids
+    ranked_ids = list(ids)
+    rng.shuffle(ranked_ids)
+    cum_weights = list(itertools.accumulate(1 / k ** s for k in range(1, n_keys + 1)))
+    return [str(quote_id) for quote_id in rng.choices(ranked_ids, cum_weights=cum_weights, k=n_lookups)]
+
+
+def make_backend(name, tmp_dir):
+    if name == "memory":
+        return InMemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(Path(tmp_dir) / "cache.sqlite3")
+    return RedisBackend(redis_stand_in.connect())
+
+
+def percentile(sorted_samples, p):
+    """ Return the p-th percentile (nearest rank) of already sorted samples. """
+    index = max(0, min(len(sorted_samples) - 1, round(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def run(quotes=100_000, lookups=200_000, threads=4, distribution="zipf", s=1.1, seed=0,
+        backend="redis", local_cache=False) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = Path(tmp_dir) / "quotes.sqlite3"
+        database.setup_db(db_path)
+        database.bulk_add_quotes(database.fake_quotes(quotes), db_path)
+
+        cache_aside.reader = CountingQuoteReader(db_path)
+        cache_aside.cache = make_backend(backend, tmp_dir)
+        # Keep the keys of this run apart from real quotes and from earlier runs in a shared Redis
+        cache_aside.CACHE_KEY_PREFIX = f"loadgen.{os.getpid()}.{seed}.quote"
+        if local_cache:
+            cache_aside.enable_local_cache()
+        else:
+            cache_aside.disable_local_cache()
+
+        stream = key_stream(quotes, lookups, distribution, s, seed)
+        # Every thread replays its own slice of the stream
+        slices = [stream[i::threads] for i in range(threads)]
+        latencies = [[] for _ in range(threads)]
+
+        def worker(i):
+            samples = latencies[i]
+            for quote_id in slices[i]:
+                start = time.perf_counter_ns()
+                cache_aside.get_quote(quote_id)
+                samples.append(time.perf_counter_ns() - start)
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        samples = sorted(itertools.chain.from_iterable(latencies))
+        return {
+            "hit_ratio": 1 - cache_aside.reader.queries / lookups,
+            "throughput": lookups / elapsed,
+            "p50_us": percentile(samples, 50) / 1000,
+            "p95_us": percentile(samples, 95) / 1000,
+            "p99_us": percentile(samples, 99) / 1000,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=100_000, help="number of quotes in the database")
+    parser.add_argument("--lookups", type=int, default=200_000, help="number of lookups to replay")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--distribution", choices=("zipf", "uniform"), default="zipf")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="exponent of the Zipf distribution")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=("redis", "memory", "sqlite"), default="redis")
+    parser.add_argument("--local-cache", action="store_true", help="put the in-process L1 cache in front")
+    args = parser.parse_args()
+
+    result = run(
+        quotes=args.quotes,
+        lookups=args.lookups,
+        threads=args.threads,
+        distribution=args.distribution,
+        s=args.zipf_s,
+        seed=args.seed,
+        backend=args.backend,
+        local_cache=args.local_cache,
+    )
+    print(f"hit ratio:  {result['hit_ratio']:.1%}")
+    print(f"throughput: {result['throughput']:,.0f} lookups/s")
+    print(f"latency:    p50 {result['p50_us']:.1f} us, p95 {result['p95_us']:.1f} us, p99 {result['p99_us']:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
+    # $ python load_generator.py --quotes 20000 --lookups 50000
+    # Table 'quotes' created
+    # Search index 'quotes_fts' created
+    # hit ratio:  85.4%
+    # throughput: 7,382 lookups/s
+    # latency:    p50 98.6 us, p95 361.5 us, p99 16199.3 us
+    # $ python load_generator.py --quotes 20000 --lookups 50000 --backend memory --local-cache --distribution uniform
+    # Table 'quotes' created
+    # Search index 'quotes_fts' created
+    # hit ratio:  63.3%
+    # throughput: 53,162 lookups/s
+    # latency:    p50 7.9 us, p95 38.3 us, p99 92.2 us
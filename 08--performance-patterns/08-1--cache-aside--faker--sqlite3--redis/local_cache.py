@@ -0,0 +1,64 @@
+"""
+A bounded in-process cache with a time to live (TTL) per entry.
+
+It is used as a first-level (L1) cache in front of Redis:
+a hit costs a dictionary lookup instead of a network round trip.
+When the cache is full, the least recently used (LRU) entry is evicted.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    def __init__(self, maxsize=1024, ttl=10.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (value, expires_at); the order of the keys is the order of use
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """ Return the cached value or `None` if the key is missing or expired. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        """ Cache a value for `ttl` seconds, but never longer than the TTL of the cache. """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,107 @@
+"""
+Reusable read-only connections to the quotes database.
+
+Opening a SQLite connection costs more than fetching a single row by its primary key.
+`QuoteReader` keeps one connection per thread and reuses it for every read.
+The queries use `?` placeholders, so the `sqlite3` module compiles each statement once
+and takes it from the per-connection statement cache (`cached_statements`) afterward,
+instead of parsing a new SQL text for every id.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+
+DB_PATH = Path(__file__).parent / Path("quotes.sqlite3")
+# Stay well below SQLite's limit on the number of host parameters in one statement
+MAX_IN_IDS = 500
+# Let SQLite read the database file through memory-mapped I/O instead of `read()` calls
+MMAP_SIZE = 64 * 1024 * 1024
+
+
+class QuoteReader:
+    def __init__(self, db_path=DB_PATH, mmap_size=MMAP_SIZE):
+        self.db_path = Path(db_path)
+        self.mmap_size = mmap_size
+        # Connections must not be shared between threads, so each thread gets its own one
+        self._local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        """ Return the connection of the current thread, opening it on first use. """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # `mode=ro` opens the file read-only, `query_only` rejects any write on the connection
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True, cached_statements=128)
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def close(self):
+        """ Close the connection of the current thread. """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def fetch_quote(self, quote_id) -> str | None:
+        """ Return the text of a quote or `None` if there is no quote with that id. """
+        row = self.connection().execute("SELECT text FROM quotes WHERE id = ?", (int(quote_id),)).fetchone()
+        return row[0] if row else None
+
+    def fetch_quotes(self, quote_ids) -> dict[int, str]:
+        """ Return the texts of the quotes found, keyed by id, using one `IN (...)` query per chunk of ids. """
+        ids = [int(quote_id) for quote_id in quote_ids]
+        quotes = {}
+        conn = self.connection()
+        for i in range(0, len(ids), MAX_IN_IDS):
+            chunk = ids[i:i + MAX_IN_IDS]
+            placeholders = ", ".join("?" * len(chunk))
+            query = f"SELECT id, text FROM quotes WHERE id IN ({placeholders})"
+            quotes.update(conn.execute(query, chunk).fetchall())
+        return quotes
+
+    def iter_quotes(self, limit=None, chunk_size=MAX_IN_IDS):
+        """
+        Yield chunks of `(id, text)` rows in the order of the ids, at most `limit` rows in total.
+        Each chunk is read by a separate query that continues after the last id seen,
+        so the whole table is never held in memory.
+        """
+        conn = self.connection()
+        last_id, remaining = 0, limit
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            rows = conn.execute(
+                "SELECT id, text FROM quotes WHERE id > ? ORDER BY id LIMIT ?", (last_id, size)
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def search(self, query: str, limit=10) -> list[tuple[int, str]]:
+        """
+        Return the `(id, text)` rows of the quotes that contain all words of `query`, best matches first.
+        The full-text index `quotes_fts` finds them without scanning the texts, unlike `LIKE '%word%'`.
+        """
+        match = match_expression(query)
+        if not match:
+            return []
+        return self.connection().execute(
+            "SELECT quotes.id, quotes.text FROM quotes_fts JOIN quotes ON quotes.id = quotes_fts.rowid "
+            "WHERE quotes_fts MATCH ? ORDER BY quotes_fts.rank LIMIT ?",
+            (match, limit),
+        ).fetchall()
+
+
+def match_expression(query: str) -> str:
+    """
+    Turn the words of a user's query into an FTS5 query that matches quotes containing all of them.
+    Every word is quoted, so characters such as `-`, `*` or `"` are searched for instead of being FTS5 syntax.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
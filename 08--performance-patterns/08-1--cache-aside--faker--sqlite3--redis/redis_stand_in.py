@@ -0,0 +1,45 @@
+"""
+A Redis client for running the benchmarks without starting a Redis server.
+
+If no Redis server is listening, an in-process stand-in from the fakeredis package is used:
+```unix
+$ pip install fakeredis
+```
+"""
+import redis
+
+
+def connect(host="localhost", port=6379, decode_responses=True, **kwargs):
+    """ Return a client of the Redis server at `host:port` or, if it is not running, a fakeredis client. """
+    client = redis.StrictRedis(host=host, port=port, decode_responses=decode_responses, **kwargs)
+    try:
+        client.ping()
+        return client
+    except redis.ConnectionError:
+        import fakeredis
+        return fakeredis.FakeStrictRedis(host=host, port=port, decode_responses=decode_responses)
+
+
+async def connect_async(host="localhost", port=6379, decode_responses=True, max_connections=50):
+    """
+    Return an asyncio client of the Redis server at `host:port` or, if it is not running, a fakeredis client.
+    Its pool opens at most `max_connections` connections; further commands wait for a free one.
+    """
+    import redis.asyncio
+    pool = redis.asyncio.BlockingConnectionPool(
+        host=host, port=port, decode_responses=decode_responses, max_connections=max_connections
+    )
+    client = redis.asyncio.StrictRedis(connection_pool=pool)
+    try:
+        await client.ping()
+        return client
+    except redis.ConnectionError:
+        await client.aclose()
+        import fakeredis
+        return fakeredis.FakeAsyncRedis(
+            host=host,
+            port=port,
+            decode_responses=decode_responses,
+            connection_pool_class=redis.asyncio.BlockingConnectionPool,
+            max_connections=max_connections,
+        )
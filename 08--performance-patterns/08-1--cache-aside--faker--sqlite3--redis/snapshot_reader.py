@@ -0,0 +1,103 @@
+"""
+Serve the quotes from an in-memory snapshot of the database.
+
+The quotes table is small and mostly read, so a copy of the whole database is kept in RAM,
+made with SQLite's online backup API.
+Every thread reads the snapshot through its own connection to a shared in-memory database.
+Every `check_interval` seconds, a read checks the modification time of the database file;
+if the file has changed, a new snapshot is taken on a background thread,
+so no request waits for the copy and the reads go on from the old snapshot until the new one is ready.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from quote_reader import DB_PATH, QuoteReader
+
+
+class SnapshotQuoteReader(QuoteReader):
+    def __init__(self, db_path=DB_PATH, check_interval=1.0):
+        super().__init__(db_path)
+        self.check_interval = check_interval
+        self._refresh_lock = threading.Lock()
+        # Guards `_next_check` and `_refreshing`, so one thread checks the file and starts one refresh at a time
+        self._check_lock = threading.Lock()
+        self._next_check = 0.0
+        self._refreshing = False
+        # (generation, URI of the in-memory database), replaced as a whole on every refresh
+        self._current = (0, None)
+        self._holder = None
+        self._mtime = None
+        self.refresh()
+
+    def _file_mtime(self) -> int:
+        # Committed writes may stay in the write-ahead log until a checkpoint copies them into the database file
+        wal_path = self.db_path.with_name(self.db_path.name + "-wal")
+        return max(path.stat().st_mtime_ns for path in (self.db_path, wal_path) if path.exists())
+
+    def refresh(self):
+        """ Copy the database file into a new in-memory database and switch the readers to it. """
+        with self._refresh_lock:
+            self._take_snapshot()
+
+    def _take_snapshot(self):
+        """ Copy the database into a new in-memory database; called with `_refresh_lock` held. """
+        # Read the time before copying, so a write during the copy triggers another refresh
+        mtime = self._file_mtime()
+        generation = self._current[0] + 1
+        uri = f"file:quotes-snapshot-{id(self)}-{generation}?mode=memory&cache=shared"
+        # The in-memory database exists as long as a connection to it is open
+        holder = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        source = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            source.backup(holder)
+        finally:
+            source.close()
+
+        old_holder = self._holder
+        self._holder, self._mtime = holder, mtime
+        self._current = (generation, uri)
+        # Threads still reading the old snapshot keep it alive until they switch over
+        if old_holder is not None:
+            old_holder.close()
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._check_lock:
+            if now < self._next_check or self._refreshing:
+                return
+            self._next_check = now + self.check_interval
+            if self._file_mtime() == self._mtime:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_in_background, name="snapshot-refresh", daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            with self._refresh_lock:
+                # Check again: `refresh()` may have taken a snapshot of the current file meanwhile
+                if self._file_mtime() != self._mtime:
+                    self._take_snapshot()
+        except Exception as e:
+            print(e)
+        finally:
+            with self._check_lock:
+                self._refreshing = False
+
+    def connection(self) -> sqlite3.Connection:
+        self._maybe_refresh()
+        generation, uri = self._current
+        local = self._local
+        if getattr(local, "generation", None) != generation:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
+            local.conn = sqlite3.connect(uri, uri=True)
+            local.conn.execute("PRAGMA query_only = ON")
+            local.generation = generation
+        return local.conn
+
+    def close(self):
+        super().close()
+        self._local.generation = None
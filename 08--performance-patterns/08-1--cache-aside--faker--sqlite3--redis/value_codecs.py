@@ -0,0 +1,157 @@
+"""
+Encodings of the cached values.
+
+By default, the quotes are cached as text and redis-py decodes every reply (`decode_responses=True`).
+`CodecBackend` stores bytes instead and encodes or decodes the values with a codec:
+
+- `Utf8Codec`: the text as UTF-8 bytes, the same bytes as by default;
+- `RawCodec`: bytes as they are, for callers that use the backend directly and can use bytes,
+e.g. to write them to a socket;
+- `CompressedCodec`: compresses values of at least `threshold` bytes with zlib or, if installed, lz4;
+- `MsgpackCodec`: structured rows, e.g. dictionaries, with msgpack if installed;
+- `JsonCodec`: structured rows as JSON, the baseline for msgpack.
+
+`cache_aside` works with text: it compares the values with its `NOT_FOUND` marker and returns them as they are,
+so `cache_aside.cache` needs a codec that decodes to `str`, i.e. `Utf8Codec` or `CompressedCodec` around it.
+With `RawCodec`, missing quotes would look like quotes and the quotes would be returned as bytes.
+
+```python
+import cache_aside
+from cache_backends import RedisBackend
+from value_codecs import CodecBackend, CompressedCodec
+
+cache_aside.cache = CodecBackend(RedisBackend(decode_responses=False), CompressedCodec.zlib(threshold=256))
+```
+"""
+import json
+import zlib
+from typing import Protocol
+
+# The first byte of a value of `CompressedCodec`
+_STORED = b"\x00"
+_COMPRESSED = b"\x01"
+
+
+class Codec(Protocol):
+    def encode(self, value) -> bytes:
+        """Return the bytes to cache for a value"""
+        ...
+
+    def decode(self, data: bytes):
+        """Return the value of cached bytes"""
+        ...
+
+
+class RawCodec:
+    """
+    Cache bytes as they are, without any decoding on a hit. Text is cached as UTF-8.
+    Hits return bytes, so this codec can't be used for `cache_aside.cache`, which works with text.
+    """
+
+    def encode(self, value):
+        return value.encode() if isinstance(value, str) else value
+
+    def decode(self, data):
+        return data
+
+
+class Utf8Codec:
+    def encode(self, value):
+        return value.encode()
+
+    def decode(self, data):
+        return data.decode()
+
+
+class CompressedCodec:
+    """
+    Compress values of at least `threshold` bytes.
+    Short values such as most quotes don't get smaller by compression, so they are stored as they are;
+    a leading byte tells which values are compressed.
+    """
+
+    def __init__(self, compress, decompress, threshold=256, inner: Codec = Utf8Codec()):
+        self.compress = compress
+        self.decompress = decompress
+        self.threshold = threshold
+        self.inner = inner
+
+    @classmethod
+    def zlib(cls, level=6, threshold=256, inner: Codec = Utf8Codec()):
+        return cls(lambda data: zlib.compress(data, level), zlib.decompress, threshold, inner)
+
+    @classmethod
+    def lz4(cls, threshold=256, inner: Codec = Utf8Codec()):
+        """ Compress with lz4, which is faster than zlib but compresses less (`pip install lz4`). """
+        import lz4.frame
+        return cls(lz4.frame.compress, lz4.frame.decompress, threshold, inner)
+
+    def encode(self, value):
+        data = self.inner.encode(value)
+        if len(data) >= self.threshold:
+            compressed = self.compress(data)
+            if len(compressed) < len(data):
+                return _COMPRESSED + compressed
+        return _STORED + data
+
+    def decode(self, data):
+        if data[:1] == _COMPRESSED:
+            return self.inner.decode(self.decompress(data[1:]))
+        return self.inner.decode(data[1:])
+
+
+class JsonCodec:
+    def encode(self, value):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    """ Cache structured values, e.g. rows as dictionaries, with msgpack (`pip install msgpack`). """
+
+    def __init__(self):
+        import msgpack
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def encode(self, value):
+        return self._packb(value)
+
+    def decode(self, data):
+        return self._unpackb(data)
+
+
+class CodecBackend:
+    """
+    Encode the values with a codec before they are stored in a backend and decode them when they are read.
+    The backend must store bytes, e.g. `RedisBackend(decode_responses=False)`.
+    """
+
+    def __init__(self, backend, codec: Codec):
+        self.backend = backend
+        self.codec = codec
+
+    def _decode(self, data):
+        return self.codec.decode(data) if data is not None else None
+
+    def get(self, key):
+        return self._decode(self.backend.get(key))
+
+    def mget(self, keys):
+        return [self._decode(data) for data in self.backend.mget(keys)]
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, self.codec.encode(value), ttl)
+
+    def set_many(self, entries):
+        encode = self.codec.encode
+        self.backend.set_many({key: (encode(value), ttl) for key, (value, ttl) in entries.items()})
+
+    def get_with_ttl(self, key):
+        data, ttl = self.backend.get_with_ttl(key)
+        return self._decode(data), ttl
+
+    def mget_with_ttl(self, keys):
+        return [(self._decode(data), ttl) for data, ttl in self.backend.mget_with_ttl(keys)]
@@ -0,0 +1,52 @@
+"""
+Memoization
+
+The *Memoization* pattern is used if a function is called with the same inputs more than once.
+Results of expensive function calls are cached to avoid repetitive and costly computations, 
+significantly reducing execution time.
+"""
+from functools import lru_cache
+
+# Example: calculate Fibonacci numbers
+
+# without memorization
+def fibonacci_func1(n):
+    if n < 2:
+        return n
+    return fibonacci_func1(n - 1) + fibonacci_func1(n - 2)
+
+
+# with memorization
+@lru_cache(maxsize=None)
+def fibonacci_func2(n):
+    return fibonacci_func1(n)
+# If the function is called again with the same arguments,
+# the result is retrieved from the cache instead of being recalculated.
+
+
+def main():
+    from microbench import Suite
+
+    n = 30
+    print(f"fibonacci_func1({n}) = {fibonacci_func1(n)}, fibonacci_func2({n}) = {fibonacci_func2(n)}")
+    suite = Suite("08-2-1--memorization")
+
+    # without memorization
+    suite.bench(fibonacci_func1, n, name=f"fibonacci_func1({n})", repeat=5)
+
+    # with memorization, the first time: the cache is cleared before every call
+    suite.bench(
+        fibonacci_func2, n, name=f"fibonacci_func2({n}), first time", repeat=5, setup=fibonacci_func2.cache_clear
+    )
+
+    # with memorization, every further time
+    suite.bench(fibonacci_func2, n, name=f"fibonacci_func2({n}), further times")
+    suite.finish()
+
+
+if __name__ == "__main__":
+    main()
+    # fibonacci_func1(30) = 832040, fibonacci_func2(30) = 832040
+    # fibonacci_func1(30): median 159 ms, mean 153 ms ± 12.1 ms, min 140 ms (5 runs x 1 call, 0 outliers)
+    # fibonacci_func2(30), first time: median 184 ms, mean 180 ms ± 18 ms, min 151 ms (5 runs x 1 call, 0 outliers)
+    # fibonacci_func2(30), further times: median 131 ns, mean 130 ns ± 2.79 ns, min 127 ns (7 runs x 524,288 calls, 1 outliers)
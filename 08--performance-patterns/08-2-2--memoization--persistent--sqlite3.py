@@ -0,0 +1,300 @@
+"""
+Memoization: a persistent cache on disk
+
+`functools.lru_cache` keeps the results in the memory of the process,
+so a process that is restarted, e.g. a batch job, calculates all of them again.
+The `persistent_memoize` decorator also stores the results in a SQLite file:
+- the key of a call is a stable hash (BLAKE2b) of the pickled arguments, with sets and dictionaries
+in a fixed order, so it is the same in every process for arguments of built-in types,
+unlike the built-in `hash()` of strings, which differs from process to process;
+- the results are stored per *version* of the function, by default a hash of its code,
+so results of an older implementation are never returned and are deleted when the cache is opened;
+pass `version` explicitly if the results also depend on other functions that may change;
+- at most about `max_entries` results of a function are kept, the least recently used ones are evicted;
+- a small LRU cache in memory, keyed by the same hash, answers repeated calls within a process
+without reading the file; unlike `functools.lru_cache`, it also takes unhashable arguments such as lists and sets.
+
+Several threads and processes can share the file:
+with write-ahead logging (WAL), readers don't wait for a writer.
+The arguments and the results must be picklable.
+"""
+import functools
+import hashlib
+import pickle
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+MEMO_PATH = Path(tempfile.gettempdir()) / "python-design-patterns-memo.sqlite3"
+# A fixed protocol, so the same arguments are pickled to the same bytes by every Python version
+PICKLE_PROTOCOL = 4
+# Evict the least recently used results after this many writes
+EVICT_EVERY = 100
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+DiskInfo = namedtuple("DiskInfo", ["hits", "misses", "max_entries", "currsize"])
+
+
+def _code_bytes(code: types.CodeType) -> bytes:
+    parts = [code.co_code, repr(code.co_names).encode()]
+    for const in code.co_consts:
+        # The repr of a nested code object contains its memory address, so its contents are used instead
+        parts.append(_code_bytes(const) if isinstance(const, types.CodeType) else repr(const).encode())
+    return b"\0".join(parts)
+
+
+def code_version(func) -> str:
+    """ Return a hash of the code of a function, which changes whenever the function is edited. """
+    return hashlib.blake2b(_code_bytes(func.__code__), digest_size=8).hexdigest()
+
+
+# Tags of the encodings of `_canonical_bytes`
+_SEQUENCE_TAGS = {list: b"L", tuple: b"T", set: b"S", frozenset: b"F"}
+
+
+def _canonical_bytes(value) -> bytes:
+    """
+    Encode a value with the elements of sets and dictionaries, also nested ones, in a fixed order:
+    the order of a set of strings depends on the hash seed of the process,
+    and equal dictionaries built in different orders are pickled differently.
+    Every part is tagged with its type and prefixed with its length, so different values can't encode the same.
+    """
+    kind = type(value)
+    if kind in _SEQUENCE_TAGS:
+        parts = [_canonical_bytes(item) for item in value]
+        if kind in (set, frozenset):
+            parts.sort()
+        tag = _SEQUENCE_TAGS[kind]
+    elif kind is dict:
+        parts = sorted(_canonical_bytes(k) + _canonical_bytes(v) for k, v in value.items())
+        tag = b"D"
+    else:
+        parts = [pickle.dumps(value, protocol=PICKLE_PROTOCOL)]
+        tag = b"P"
+    data = b"".join(parts)
+    return tag + len(parts).to_bytes(8, "little") + len(data).to_bytes(8, "little") + data
+
+
+def stable_key(args, kwargs) -> bytes:
+    """
+    Return a hash of the arguments that is the same in every process
+    for arguments made of built-in types, including sets and dictionaries, see `_canonical_bytes`.
+    Other objects are hashed by their pickles as they are,
+    so an object whose pickle depends on the order of a set or a dictionary inside may get another key.
+    """
+    return hashlib.blake2b(_canonical_bytes((args, kwargs)), digest_size=16).digest()
+
+
+class DiskMemo:
+    """ The results of one version of one function in a SQLite file. """
+
+    def __init__(self, path, name, version, max_entries):
+        self.path = Path(path)
+        self.name = name
+        self.version = version
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._writes = 0
+        # Connections must not be shared between threads, so each thread gets its own one
+        self._local = threading.local()
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS memo("
+                "function TEXT, key BLOB, version TEXT, value BLOB, used_at REAL, PRIMARY KEY(function, key)"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS memo_used_at ON memo(function, used_at)")
+            # Results of other versions of the function will never be read again
+            conn.execute("DELETE FROM memo WHERE function = ? AND version != ?", (name, version))
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def get(self, key: bytes):
+        """ Return `(True, value)` for a stored key or `(False, None)`. """
+        conn = self.connection()
+        row = conn.execute(
+            "SELECT value FROM memo WHERE function = ? AND key = ? AND version = ?", (self.name, key, self.version)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        with conn:
+            conn.execute("UPDATE memo SET used_at = ? WHERE function = ? AND key = ?", (time.time(), self.name, key))
+        return True, pickle.loads(row[0])
+
+    def set(self, key: bytes, value):
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO memo(function, key, version, value, used_at) VALUES(?, ?, ?, ?, ?)",
+                (self.name, key, self.version, pickle.dumps(value, protocol=PICKLE_PROTOCOL), time.time()),
+            )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """ Delete the least recently used results above `max_entries`. """
+        conn = self.connection()
+        with conn:
+            (count,) = conn.execute("SELECT count(*) FROM memo WHERE function = ?", (self.name,)).fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM memo WHERE function = ? AND key IN "
+                    "(SELECT key FROM memo WHERE function = ? ORDER BY used_at LIMIT ?)",
+                    (self.name, self.name, count - self.max_entries),
+                )
+
+    def clear(self):
+        conn = self.connection()
+        with conn:
+            conn.execute("DELETE FROM memo WHERE function = ?", (self.name,))
+
+    def info(self) -> DiskInfo:
+        (count,) = self.connection().execute("SELECT count(*) FROM memo WHERE function = ?", (self.name,)).fetchone()
+        return DiskInfo(self.hits, self.misses, self.max_entries, count)
+
+
+def function_name(func) -> str:
+    """
+    Return the name the results of a function are stored under.
+    Every script run directly is the module `__main__`, so the path of the script is used instead;
+    otherwise, same-named functions of two scripts would share their results and delete each other's versions.
+    """
+    module = func.__module__
+    if module == "__main__":
+        file = getattr(sys.modules[module], "__file__", None)
+        if file is not None:
+            module = str(Path(file).resolve())
+    return f"{module}.{func.__qualname__}"
+
+
+def persistent_memoize(
+    func=None, *, path=MEMO_PATH, name=None, version=None, max_entries=10_000, memory_maxsize=128
+):
+    """
+    Memoize `func` in memory and in a SQLite file,
+    usable as `@persistent_memoize` or with options as `@persistent_memoize(version="2", max_entries=1000)`.
+    The results are stored under `name`, by default the module, or the path of a script run directly,
+    and the qualified name of the function.
+    """
+    if func is None:
+        return functools.partial(
+            persistent_memoize,
+            path=path, name=name, version=version, max_entries=max_entries, memory_maxsize=memory_maxsize,
+        )
+    disk = DiskMemo(path, name or function_name(func), version or code_version(func), max_entries)
+
+    # The in-memory layer, keyed by `stable_key` like the file, so arguments need not be hashable
+    memory = OrderedDict()
+    lock = threading.Lock()
+    stats = {"hits": 0, "misses": 0}
+
+    @functools.wraps(func)
+    def memoizer(*args, **kwargs):
+        key = stable_key(args, kwargs)
+        with lock:
+            if key in memory:
+                memory.move_to_end(key)
+                stats["hits"] += 1
+                return memory[key]
+            stats["misses"] += 1
+        found, value = disk.get(key)
+        if not found:
+            value = func(*args, **kwargs)
+            disk.set(key, value)
+        with lock:
+            memory[key] = value
+            memory.move_to_end(key)
+            if memory_maxsize is not None and len(memory) > memory_maxsize:
+                memory.popitem(last=False)
+        return value
+
+    def cache_info() -> CacheInfo:
+        with lock:
+            return CacheInfo(stats["hits"], stats["misses"], memory_maxsize, len(memory))
+
+    def cache_clear():
+        with lock:
+            memory.clear()
+            stats["hits"] = stats["misses"] = 0
+
+    memoizer.cache_info = cache_info
+    memoizer.cache_clear = cache_clear
+    memoizer.disk = disk
+    return memoizer
+
+
+# Example: the functions of `08-2-1--memorization--functools--lru_cache.py`
+# and `08-3-2--lazy-loading--using-caching--lru_cache.py`, whose results now survive restarts
+
+def fibonacci_func1(n):
+    if n < 2:
+        return n
+    return fibonacci_func1(n - 1) + fibonacci_func1(n - 2)
+
+
+# `fibonacci_func2` only calls `fibonacci_func1`, so a change of `fibonacci_func1` needs a new version
+@persistent_memoize(version="fibonacci_func1-1")
+def fibonacci_func2(n):
+    return fibonacci_func1(n)
+
+
+def recursive_factorial(n):
+    """ Calculate factorial (expensive for large n). """
+    if n == 1:
+        return 1
+    else:
+        return n * recursive_factorial(n - 1)
+
+
+@persistent_memoize(version="recursive_factorial-1", max_entries=128)
+def cached_factorial(n):
+    return recursive_factorial(n)
+
+
+def main():
+    for func, n in ((fibonacci_func2, 30), (cached_factorial, 500)):
+        for label in ("first", "second"):
+            start = time.perf_counter()
+            result = func(n)
+            duration = time.perf_counter() - start
+            print(f"{func.__name__}({n}) = {str(result)[:20]}..., calculated in {duration * 1000:.3f} ms "
+                  f"for the {label} time")
+        print(func.cache_info())
+        print(func.disk.info())
+
+
+if __name__ == "__main__":
+    main()
+    # $ python 08-2-2--memoization--persistent--sqlite3.py
+    # fibonacci_func2(30) = 832040..., calculated in 133.745 ms for the first time
+    # fibonacci_func2(30) = 832040..., calculated in 0.065 ms for the second time
+    # CacheInfo(hits=1, misses=1, maxsize=128, currsize=1)
+    # DiskInfo(hits=0, misses=1, max_entries=10000, currsize=1)
+    # cached_factorial(500) = 12201368259911100687..., calculated in 0.308 ms for the first time
+    # cached_factorial(500) = 12201368259911100687..., calculated in 0.023 ms for the second time
+    # CacheInfo(hits=1, misses=1, maxsize=128, currsize=1)
+    # DiskInfo(hits=0, misses=1, max_entries=128, currsize=1)
+    # $ python 08-2-2--memoization--persistent--sqlite3.py
+    # fibonacci_func2(30) = 832040..., calculated in 0.543 ms for the first time
+    # fibonacci_func2(30) = 832040..., calculated in 0.028 ms for the second time
+    # CacheInfo(hits=1, misses=1, maxsize=128, currsize=1)
+    # DiskInfo(hits=1, misses=0, max_entries=10000, currsize=1)
+    # cached_factorial(500) = 12201368259911100687..., calculated in 0.097 ms for the first time
+    # cached_factorial(500) = 12201368259911100687..., calculated in 0.013 ms for the second time
+    # CacheInfo(hits=1, misses=1, maxsize=128, currsize=1)
+    # DiskInfo(hits=1, misses=0, max_entries=128, currsize=1)
@@ -0,0 +1,133 @@
+"""
+Memoization: memoize the recursion, or use a better algorithm
+
+In `08-2-1--memorization--functools--lru_cache.py`, `fibonacci_func2` caches only the result of the outermost call:
+it calls the unmemoized `fibonacci_func1`, so its first call still takes exponential time.
+`fibonacci_func3` below is memoized itself, so every recursive call goes through the cache
+and each Fibonacci number is calculated once: n additions instead of about 1.6^n.
+Its recursion is still n calls deep, so it fails for large n on a cold cache
+(every call also goes through the `lru_cache` wrapper, so the limit is about 500).
+
+Often, a better algorithm beats any cache. *Fast doubling* uses the identities
+F(2k) = F(k) * (2 * F(k + 1) - F(k)) and F(2k + 1) = F(k)^2 + F(k + 1)^2
+to go from F(k) to F(2k) or F(2k + 1) with three multiplications,
+so F(n) takes about log2(n) steps on Python's big integers and no cache at all.
+
+`fibonacci_many` calculates many Fibonacci numbers in one pass over the sorted n:
+it moves from F(m) to F(n) by adding, if n is close to m, or by the identities
+F(m + d) = F(m + 1) * F(d) + F(m) * F(d - 1) and F(m + d + 1) = F(m + 1) * F(d + 1) + F(m) * F(d) otherwise,
+where F(d) and F(d + 1) are calculated once per distinct gap d.
+"""
+import time
+from functools import lru_cache
+
+# Move forward by additions for gaps up to this size
+SMALL_GAP = 64
+
+
+# The functions of `08-2-1--memorization--functools--lru_cache.py`
+def fibonacci_func1(n):
+    if n < 2:
+        return n
+    return fibonacci_func1(n - 1) + fibonacci_func1(n - 2)
+
+
+@lru_cache(maxsize=None)
+def fibonacci_func2(n):
+    return fibonacci_func1(n)
+
+
+# The recursive calls are memoized as well
+@lru_cache(maxsize=None)
+def fibonacci_func3(n):
+    if n < 2:
+        return n
+    return fibonacci_func3(n - 1) + fibonacci_func3(n - 2)
+
+
+def fibonacci_pair(n) -> tuple[int, int]:
+    """ Return `(F(n), F(n + 1))` by fast doubling, going through the bits of n from the highest one. """
+    if n < 0:
+        raise ValueError("n must be non-negative")
+    a, b = 0, 1  # F(k), F(k + 1) for k = 0
+    for bit in bin(n)[2:]:
+        # k -> 2k
+        a, b = a * (2 * b - a), a * a + b * b
+        if bit == "1":
+            # 2k -> 2k + 1
+            a, b = b, a + b
+    return a, b
+
+
+def fibonacci(n) -> int:
+    return fibonacci_pair(n)[0]
+
+
+def fibonacci_many(ns) -> list[int]:
+    """ Return F(n) for every n of `ns`, in the order of `ns`, calculated in one pass over the sorted n. """
+    results = {}
+    gaps = {}
+    m, a, b = 0, 0, 1  # m, F(m), F(m + 1)
+    for n in sorted(set(ns)):
+        if n < 0:
+            raise ValueError("n must be non-negative")
+        d = n - m
+        if d <= SMALL_GAP:
+            for _ in range(d):
+                a, b = b, a + b
+        else:
+            if d not in gaps:
+                gaps[d] = fibonacci_pair(d)
+            fd, fd1 = gaps[d]
+            a, b = b * fd + a * (fd1 - fd), b * fd1 + a * fd
+        m = n
+        results[n] = a
+    return [results[n] for n in ns]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    n = 30
+    for func in (fibonacci_func1, fibonacci_func2, fibonacci_func3, fibonacci):
+        result, duration = timed(func, n)
+        print(f"{func.__name__}({n}) = {result}, calculated in {duration * 1000:.3f} ms")
+
+    n = 400
+    fibonacci_func3.cache_clear()
+    for func in (fibonacci_func3, fibonacci):
+        result, duration = timed(func, n)
+        print(f"{func.__name__}({n}) = {str(result)[:20]}..., calculated in {duration * 1000:.3f} ms")
+    try:
+        fibonacci_func3(5000)
+    except RecursionError as e:
+        print(f"fibonacci_func3(5000) with a cold cache: RecursionError: {e}")
+
+    for n in (10_000, 1_000_000):
+        result, duration = timed(fibonacci, n)
+        print(f"fibonacci({n:,}) has {result.bit_length():,} bits, calculated in {duration * 1000:.3f} ms")
+
+    ns = list(range(0, 200_000, 100))
+    results, duration_one_by_one = timed(lambda: [fibonacci(n) for n in ns])
+    batch_results, duration_batch = timed(fibonacci_many, ns)
+    assert batch_results == results
+    print(f"{len(ns):,} Fibonacci numbers up to F({ns[-1]:,}): "
+          f"{duration_one_by_one * 1000:.1f} ms one by one, {duration_batch * 1000:.1f} ms with fibonacci_many")
+
+
+if __name__ == "__main__":
+    main()
+    # fibonacci_func1(30) = 832040, calculated in 152.097 ms
+    # fibonacci_func2(30) = 832040, calculated in 128.117 ms
+    # fibonacci_func3(30) = 832040, calculated in 0.036 ms
+    # fibonacci(30) = 832040, calculated in 0.017 ms
+    # fibonacci_func3(400) = 17602368064501396646..., calculated in 0.501 ms
+    # fibonacci(400) = 17602368064501396646..., calculated in 0.012 ms
+    # fibonacci_func3(5000) with a cold cache: RecursionError: maximum recursion depth exceeded while calling a Python object
+    # fibonacci(10,000) has 6,942 bits, calculated in 0.065 ms
+    # fibonacci(1,000,000) has 694,241 bits, calculated in 74.124 ms
+    # 2,000 Fibonacci numbers up to F(199,900): 4843.1 ms one by one, 133.5 ms with fibonacci_many
@@ -4,9 +4,8 @@ Lazy Loading
 The *Lazy Loading* pattern is used to defer the initialization or loading of resources
 until they are actually needed.
 """
-import time
-from datetime import timedelta
 from functools import lru_cache
+from microbench import Suite
 
 # Example: calculating factorial (the `math` module has a better implementation)
 
@@ -27,31 +26,23 @@ def cached_factorial(n):
 
 def main():
     n = 100
+    print(f"recursive_factorial({n}) = {recursive_factorial(n)}")
+    suite = Suite("08-3-2--lazy-loading")
 
     # without caching
-    start_time = time.time()
-    result = recursive_factorial(n)
-    stop_time = time.time()
-    duration = stop_time - start_time
-    print(f"recursive_factorial({n}) = {result}, calculated in {duration}")
+    suite.bench(recursive_factorial, n, name=f"recursive_factorial({n})")
 
-    # with caching
+    # with caching, the first time: the cache is cleared before every call
+    suite.bench(cached_factorial, n, name=f"cached_factorial({n}), first time", setup=cached_factorial.cache_clear)
 
-    start_time = time.time()
-    result = cached_factorial(n)
-    stop_time = time.time()
-    duration = stop_time - start_time
-    print(f"cached_factorial({n}) = {result}, calculated in {duration} for the first time")
-
-    start_time = time.time()
-    result = cached_factorial(n)
-    stop_time = time.time()
-    duration = stop_time - start_time
-    print(f"cached_factorial({n}) = {result}, calculated in {duration} for the second time")
+    # with caching, every further time
+    suite.bench(cached_factorial, n, name=f"cached_factorial({n}), further times")
+    suite.finish()
 
 
 if __name__ == "__main__":
     main()
-    # recursive_factorial(100) = 93326215443944152681699238856266700490715968264381621468592963895217599993229915608941463976156518286253697920827223758251185210916864000000000000000000000000, calculated in 1.33514404296875e-05
-    # cached_factorial(100) = 93326215443944152681699238856266700490715968264381621468592963895217599993229915608941463976156518286253697920827223758251185210916864000000000000000000000000, calculated in 1.0013580322265625e-05 for the first time
-    # cached_factorial(100) = 93326215443944152681699238856266700490715968264381621468592963895217599993229915608941463976156518286253697920827223758251185210916864000000000000000000000000, calculated in 1.6689300537109375e-06 for the second time
+    # recursive_factorial(100) = 93326215443944152681699238856266700490715968264381621468592963895217599993229915608941463976156518286253697920827223758251185210916864000000000000000000000000
+    # recursive_factorial(100): median 14.4 us, mean 14.5 us ± 237 ns, min 14.2 us (7 runs x 4,096 calls, 0 outliers)
+    # cached_factorial(100), first time: median 14.3 us, mean 14.4 us ± 375 ns, min 14.1 us (7 runs x 1 call, 1 outliers)
+    # cached_factorial(100), further times: median 131 ns, mean 131 ns ± 0.97 ns, min 129 ns (7 runs x 524,288 calls, 0 outliers)
@@ -0,0 +1,148 @@
+"""
+Lazy Loading: a lazily grown table of factorials
+
+`recursive_factorial` in `08-3-2--lazy-loading--using-caching--lru_cache.py` calls itself once per n,
+so it exceeds the recursion limit around n = 1000,
+and its `lru_cache` only caches the outermost call, not the factorials calculated on the way.
+
+`factorial` below has no recursion over n:
+- the factorials up to `TABLE_SIZE` are kept in a table, which is grown only as far as the largest n asked for,
+each entry calculated from the previous one with one multiplication;
+- a larger n! is the last entry of the table multiplied by the product of the remaining numbers,
+calculated by *binary splitting*: the range is split in halves and the products of the halves are multiplied,
+so the big multiplications are done on numbers of similar size, which is much faster
+than multiplying a huge number by one small number after another.
+
+`factorials` calculates many factorials in one pass over the sorted n:
+each factorial is the previous one multiplied by the product of the numbers in between.
+"""
+import math
+import threading
+import time
+from functools import lru_cache
+
+# Keep n! for n up to this size in the table
+TABLE_SIZE = 1000
+# Multiply ranges up to this length one number after another
+SPLIT_BELOW = 16
+
+_table = [1]  # _table[n] == n!
+_table_lock = threading.Lock()
+
+
+# The functions of `08-3-2--lazy-loading--using-caching--lru_cache.py`
+def recursive_factorial(n):
+    """ Calculate factorial (expensive for large n). """
+    if n == 1:
+        return 1
+    else:
+        return n * recursive_factorial(n - 1)
+
+
+@lru_cache(maxsize=128)
+def cached_factorial(n):
+    return recursive_factorial(n)
+
+
+def _table_factorial(n):
+    """ Return n! from the table, growing the table up to n first if needed. """
+    if n >= len(_table):
+        # Threads that grow the table at the same time would append the same entries twice
+        with _table_lock:
+            value = _table[-1]
+            for k in range(len(_table), n + 1):
+                value *= k
+                _table.append(value)
+    return _table[n]
+
+
+def product(low, high) -> int:
+    """ Return the product of the integers in `range(low, high)` by binary splitting. """
+    if high - low <= SPLIT_BELOW:
+        result = 1
+        for k in range(low, high):
+            result *= k
+        return result
+    middle = (low + high) // 2
+    return product(low, middle) * product(middle, high)
+
+
+def factorial(n) -> int:
+    if n < 0:
+        raise ValueError("factorial() not defined for negative values")
+    if n <= TABLE_SIZE:
+        return _table_factorial(n)
+    return _table_factorial(TABLE_SIZE) * product(TABLE_SIZE + 1, n + 1)
+
+
+def factorials(ns) -> list[int]:
+    """ Return n! for every n of `ns`, in the order of `ns`, calculated in one pass over the sorted n. """
+    results = {}
+    m, value = 0, 1  # m, m!
+    for n in sorted(set(ns)):
+        if n < 0:
+            raise ValueError("factorial() not defined for negative values")
+        if n <= TABLE_SIZE:
+            value = _table_factorial(n)
+        else:
+            if m < TABLE_SIZE:
+                m, value = TABLE_SIZE, _table_factorial(TABLE_SIZE)
+            value *= product(m + 1, n + 1)
+        m = n
+        results[n] = value
+    return [results[n] for n in ns]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    n = 100
+    for name, func in (
+        ("recursive_factorial", recursive_factorial),
+        ("cached_factorial", cached_factorial),
+        ("math.factorial", math.factorial),
+        ("factorial", factorial),
+    ):
+        result, duration = timed(func, n)
+        print(f"{name}({n}) = {str(result)[:20]}..., calculated in {duration * 1000:.3f} ms")
+    result, duration = timed(factorial, n)
+    print(f"factorial({n}) = {str(result)[:20]}..., calculated in {duration * 1000:.3f} ms from the table")
+
+    try:
+        recursive_factorial(5000)
+    except RecursionError as e:
+        print(f"recursive_factorial(5000): RecursionError: {e}")
+
+    for n in (10_000, 100_000):
+        results = []
+        for name, func in (("math.factorial", math.factorial), ("factorial", factorial)):
+            result, duration = timed(func, n)
+            results.append(result)
+            print(f"{name}({n:,}) has {result.bit_length():,} bits, calculated in {duration * 1000:.1f} ms")
+        assert results[0] == results[1]
+
+    ns = list(range(0, 20_000, 20))
+    expected, duration_one_by_one = timed(lambda: [math.factorial(n) for n in ns])
+    batch, duration_batch = timed(factorials, ns)
+    assert batch == expected
+    print(f"{len(ns):,} factorials up to {ns[-1]:,}!: {duration_one_by_one * 1000:.1f} ms one by one "
+          f"with math.factorial, {duration_batch * 1000:.1f} ms with factorials")
+
+
+if __name__ == "__main__":
+    main()
+    # recursive_factorial(100) = 93326215443944152681..., calculated in 0.059 ms
+    # cached_factorial(100) = 93326215443944152681..., calculated in 0.013 ms
+    # math.factorial(100) = 93326215443944152681..., calculated in 0.005 ms
+    # factorial(100) = 93326215443944152681..., calculated in 0.022 ms
+    # factorial(100) = 93326215443944152681..., calculated in 0.001 ms from the table
+    # recursive_factorial(5000): RecursionError: maximum recursion depth exceeded
+    # math.factorial(10,000) has 118,459 bits, calculated in 3.3 ms
+    # factorial(10,000) has 118,459 bits, calculated in 4.7 ms
+    # math.factorial(100,000) has 1,516,705 bits, calculated in 159.1 ms
+    # factorial(100,000) has 1,516,705 bits, calculated in 272.8 ms
+    # 1,000 factorials up to 19,980!: 5100.5 ms one by one with math.factorial, 60.2 ms with factorials
@@ -0,0 +1,199 @@
+"""
+Lazy Loading: thread-safe, once-only loading and prefetching
+
+`LazyLoadedData.data` in `08-3-1--lazy-loading--lazy-attribute-loading.py` checks `self._data is None`
+without a lock, so threads that access `data` at the same time all see `None` and all load the data.
+
+`Lazy` wraps a loader function and loads its value once:
+- *double-checked locking*: `get()` returns the loaded value without taking the lock;
+only while the value isn't loaded yet, it takes the lock and checks again,
+so one thread loads the value and the others wait for it;
+- if the loader raises an exception, the exception goes to the caller and nothing is stored,
+so the next `get()` tries again;
+- `prefetch()` starts loading on a background thread (or in an executor) and returns at once,
+so the value may be ready by the time it is needed; `get()` waits for a prefetch that is still running.
+
+`LazyRegistry` keeps named lazy resources and warms them in parallel, e.g. at startup.
+Threads run in parallel while they wait for I/O; CPU-bound loaders are serialized by the GIL.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_MISSING = object()
+# Counts the calls of `load_data`; `next()` of a counter is atomic under the GIL
+loads = itertools.count(1)
+
+
+class Lazy:
+    def __init__(self, loader, name=None):
+        self.loader = loader
+        self.name = name or getattr(loader, "__name__", "lazy")
+        self._value = _MISSING
+        self._lock = threading.Lock()
+        # The exception raised by the loader in a prefetch, for the next `get()`
+        self._error = None
+        self._prefetching = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._value is not _MISSING
+
+    def get(self):
+        # The first check without the lock: the value is stored only after it is fully loaded
+        value = self._value
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            # The second check: another thread may have loaded the value while this one waited for the lock
+            if self._value is _MISSING:
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+                self._value = self.loader()
+            return self._value
+
+    def _prefetch(self):
+        with self._lock:
+            try:
+                if self._value is _MISSING:
+                    # A new prefetch tries again instead of reporting the failure of an earlier one
+                    self._error = None
+                    self._value = self.loader()
+            except Exception as e:
+                self._error = e
+            finally:
+                self._prefetching = False
+
+    def prefetch(self, executor=None) -> "Lazy":
+        """ Start loading on a background thread, or in `executor`, unless loaded or being loaded already. """
+        with self._lock:
+            if self.loaded or self._prefetching:
+                return self
+            self._prefetching = True
+        if executor is not None:
+            executor.submit(self._prefetch)
+        else:
+            threading.Thread(target=self._prefetch, name=f"prefetch-{self.name}", daemon=True).start()
+        return self
+
+
+class LazyRegistry:
+    def __init__(self):
+        self._resources = {}
+
+    def register(self, name, loader) -> Lazy:
+        lazy = Lazy(loader, name)
+        self._resources[name] = lazy
+        return lazy
+
+    def __getitem__(self, name):
+        return self._resources[name].get()
+
+    def warm_all(self, max_workers=None) -> dict[str, Exception]:
+        """ Load all the resources in parallel, wait for them, and return the exceptions by name. """
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warm") as executor:
+            futures = {name: executor.submit(lazy.get) for name, lazy in self._resources.items()}
+        return {name: future.exception() for name, future in futures.items() if future.exception() is not None}
+
+
+# The class of `08-3-1--lazy-loading--lazy-attribute-loading.py`, which loads slowly, e.g. from a disk
+class LazyLoadedData:
+    def __init__(self):
+        # Expensive data hasn't been loaded yet
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.load_data()
+
+        return self._data
+
+    def load_data(self):
+        next(loads)
+        time.sleep(0.1)
+        return sum(i * i for i in range(100000))
+
+
+class ThreadSafeLazyLoadedData(LazyLoadedData):
+    def __init__(self):
+        super().__init__()
+        self._data = Lazy(self.load_data)
+
+    @property
+    def data(self):
+        return self._data.get()
+
+    def prefetch(self):
+        self._data.prefetch()
+
+
+def access_from_threads(obj, n_threads=8):
+    # All the threads access `data` at the same moment
+    barrier = threading.Barrier(n_threads)
+
+    def access():
+        barrier.wait()
+        return obj.data
+
+    before = next(loads)
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        values = set(executor.map(lambda _: access(), range(n_threads)))
+    return values, next(loads) - before - 1
+
+
+def timed_access(obj):
+    start = time.perf_counter()
+    obj.data
+    return time.perf_counter() - start
+
+
+def slow_loader(name, seconds):
+    def load():
+        time.sleep(seconds)
+        if name == "feature_flags":
+            raise ConnectionError("flag service unavailable")
+        return f"{name} ready"
+
+    load.__name__ = name
+    return load
+
+
+def main():
+    for cls in (LazyLoadedData, ThreadSafeLazyLoadedData):
+        values, n_loads = access_from_threads(cls())
+        print(f"8 threads access {cls.__name__}.data: values {values}, load_data called {n_loads}x")
+
+    obj = ThreadSafeLazyLoadedData()
+    print(f"The first access without prefetching waits {timed_access(obj):.3f} s")
+    obj = ThreadSafeLazyLoadedData()
+    obj.prefetch()
+    # Meanwhile, do some other work
+    time.sleep(0.15)
+    print(f"The first access after prefetching waits {timed_access(obj):.3f} s")
+
+    registry = LazyRegistry()
+    for name in ("config", "templates", "search_index", "model", "feature_flags"):
+        registry.register(name, slow_loader(name, 0.2))
+    start = time.perf_counter()
+    errors = registry.warm_all()
+    print(f"5 resources warmed in {time.perf_counter() - start:.2f} s, errors: {errors}")
+    start = time.perf_counter()
+    print(f"{registry['model']} in {time.perf_counter() - start:.3f} s")
+    try:
+        registry["feature_flags"]
+    except ConnectionError as e:
+        print(f"feature_flags is loaded again on access: ConnectionError: {e}")
+
+
+if __name__ == "__main__":
+    main()
+    # 8 threads access LazyLoadedData.data: values {333328333350000}, load_data called 8x
+    # 8 threads access ThreadSafeLazyLoadedData.data: values {333328333350000}, load_data called 1x
+    # The first access without prefetching waits 0.112 s
+    # The first access after prefetching waits 0.000 s
+    # 5 resources warmed in 0.20 s, errors: {'feature_flags': ConnectionError('flag service unavailable')}
+    # model ready in 0.000 s
+    # feature_flags is loaded again on access: ConnectionError: flag service unavailable
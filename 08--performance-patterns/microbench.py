@@ -0,0 +1,190 @@
+"""
+A micro-benchmark harness for the performance examples.
+
+- The time is read with `time.perf_counter_ns()`, a monotonic clock with the highest available resolution;
+`time.time()` has a coarser resolution and can jump when the system clock is adjusted.
+- Warm-up runs come before the measured runs, so the measured runs don't pay for first-time costs.
+- Every measured run (repeat) calls the function `number` times; by default, `number` is chosen
+so that a run takes at least `min_time` seconds, which makes the clock resolution negligible.
+- Runs disturbed by other processes are dropped as outliers: runs outside Tukey's fences,
+more than 1.5 interquartile ranges below the first or above the third quartile.
+- The summary gives the median, the mean, the standard deviation and the minimum time per call.
+- The results can be saved as JSON and compared with the results of another run:
+
+```unix
+$ python 08-2-1--memorization--functools--lru_cache.py --json before.json
+$ python 08-2-1--memorization--functools--lru_cache.py --json after.json
+$ python microbench.py before.json after.json
+```
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+
+
+def format_ns(ns: float) -> str:
+    """ Format a duration in nanoseconds with a suitable unit. """
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.3g} {unit}"
+    return f"{ns:.3g} ns"
+
+
+def drop_outliers(samples: list[float]) -> list[float]:
+    """ Return the samples within Tukey's fences; with fewer than 4 samples, return them all. """
+    if len(samples) < 4:
+        return list(samples)
+    q1, _, q3 = statistics.quantiles(samples, n=4)
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    return [sample for sample in samples if low <= sample <= high]
+
+
+@dataclass
+class Result:
+    name: str
+    # Calls per run
+    number: int
+    # Time per call of every measured run, in nanoseconds
+    per_call_ns: list[float]
+    # Time per call of the runs that are not outliers
+    kept_ns: list[float] = field(init=False)
+
+    def __post_init__(self):
+        self.kept_ns = drop_outliers(self.per_call_ns)
+
+    @property
+    def outliers(self) -> int:
+        return len(self.per_call_ns) - len(self.kept_ns)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.kept_ns)
+
+    @property
+    def mean(self) -> float:
+        return statistics.fmean(self.kept_ns)
+
+    @property
+    def stdev(self) -> float:
+        return statistics.stdev(self.kept_ns) if len(self.kept_ns) > 1 else 0.0
+
+    @property
+    def min(self) -> float:
+        return min(self.kept_ns)
+
+    def summary(self) -> str:
+        return (
+            f"median {format_ns(self.median)}, mean {format_ns(self.mean)} ± {format_ns(self.stdev)}, "
+            f"min {format_ns(self.min)} ({len(self.per_call_ns)} runs x {self.number:,} call{'s' * (self.number > 1)}, "
+            f"{self.outliers} outliers)"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "median_ns": self.median,
+            "mean_ns": self.mean,
+            "stdev_ns": self.stdev,
+            "min_ns": self.min,
+            "outliers": self.outliers,
+        }
+
+
+def _run(func, args, kwargs, number) -> int:
+    """ Return the nanoseconds taken by `number` calls. """
+    start = time.perf_counter_ns()
+    for _ in range(number):
+        func(*args, **kwargs)
+    return time.perf_counter_ns() - start
+
+
+def bench(func, *args, name=None, repeat=7, number=None, warmup=1, min_time=0.05, setup=None, **kwargs) -> Result:
+    """
+    Measure `func(*args, **kwargs)`.
+    With `setup`, e.g. a `cache_clear` function, `setup()` is called before every single call and is not timed,
+    so every call starts from the same state.
+    """
+    name = name or func.__name__
+    if setup is not None:
+        samples = []
+        for i in range(warmup + repeat):
+            setup()
+            elapsed = _run(func, args, kwargs, 1)
+            if i >= warmup:
+                samples.append(elapsed)
+        return Result(name, 1, samples)
+
+    if number is None:
+        # Double the number of calls until a run takes long enough; these runs also warm up
+        number = 1
+        while _run(func, args, kwargs, number) < min_time * 1e9:
+            number *= 2
+    for _ in range(warmup):
+        _run(func, args, kwargs, number)
+    return Result(name, number, [_run(func, args, kwargs, number) / number for _ in range(repeat)])
+
+
+class Suite:
+    """ Run benchmarks, print their summaries and save them as JSON if the script is run with `--json PATH`. """
+
+    def __init__(self, name):
+        self.name = name
+        self.results = []
+
+    def bench(self, func, *args, **options) -> Result:
+        result = bench(func, *args, **options)
+        self.results.append(result)
+        print(f"{result.name}: {result.summary()}")
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "suite": self.name,
+            "python": sys.version,
+            "platform": platform.platform(),
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "results": [result.to_dict() for result in self.results],
+        }
+
+    def save_json(self, path):
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+    def finish(self, argv=None):
+        parser = argparse.ArgumentParser()
+        parser.add_argument("--json", metavar="PATH", help="save the results as JSON")
+        args, _ = parser.parse_known_args(argv)
+        if args.json:
+            self.save_json(args.json)
+            print(f"Results saved to {args.json}")
+
+
+def compare(baseline: dict, current: dict):
+    """ Print the median of every benchmark in two saved runs and how many times faster the second run is. """
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    for result in current["results"]:
+        old = baseline_results.get(result["name"])
+        if old is None:
+            print(f"{result['name']}: {format_ns(result['median_ns'])} (new)")
+            continue
+        speedup = old["median_ns"] / result["median_ns"]
+        print(f"{result['name']}: {format_ns(old['median_ns'])} -> {format_ns(result['median_ns'])} "
+              f"({speedup:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the results of two benchmark runs saved as JSON.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    args = parser.parse_args()
+    with open(args.baseline) as baseline, open(args.current) as current:
+        compare(json.load(baseline), json.load(current))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,29 +4,32 @@ a new string object each time, which is inefficient for large loop repetitions.
 Use `join` instead that is more efficient
 when concatenating strings from a sequence or iterable.
 """
-import time
-from datetime import timedelta
+import sys
+from pathlib import Path
+
+# The benchmark harness of the performance patterns
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "08--performance-patterns"))
+from microbench import Suite
 
 my_list = list(str(i) for i in range(1000))
 
-start_time = time.time()
-# ----------------------------------------
+
 # not recommended
-result = ""
-for item in my_list:
-    result += f", {item}"
-# ----------------------------------------
-stop_time = time.time()
-duration = timedelta(stop_time - start_time)
-print(f"Duration: {duration}")
-# Duration: 0:00:17.509460
-
-start_time = time.time()
-# ----------------------------------------
+def concatenate(items):
+    result = ""
+    for item in items:
+        result += f", {item}"
+    return result
+
+
 # much better
-result = ", ".join(my_list)
-# ----------------------------------------
-stop_time = time.time()
-duration = timedelta(stop_time - start_time)
-print(f"Duration: {duration}")
-# Duration: 0:00:00.926971
+def join(items):
+    return ", ".join(items)
+
+
+suite = Suite("11-4-1--concatenating-strings")
+suite.bench(concatenate, my_list)
+# concatenate: median 100 us, mean 99.1 us ± 3.11 us, min 95 us (7 runs x 512 calls, 0 outliers)
+suite.bench(join, my_list)
+# join: median 10.7 us, mean 10.8 us ± 752 ns, min 9.66 us (7 runs x 8,192 calls, 1 outliers)
+suite.finish()